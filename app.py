@@ -1,16 +1,65 @@
+from __future__ import annotations   # annotations non évaluées : np/go restent différés
 import reflex as rx
-import urllib.request
+from reflex.utils import format as rx_format
+from reflex.state import _override_base_method
+import asyncio
+import random
+import ssl
+import socket
+import weakref
 import re
 import html
-import json
 import time
-import plotly.graph_objects as go
-import numpy as np
-from datetime import datetime
+import os
+import zlib
+import sqlite3
+import threading
+import functools
+import contextlib
+import contextvars
+import bisect
+import warnings
+import hashlib
+import email.utils
+import json
+import itertools
+import importlib
+import csv
+import io
+import gzip
+from datetime import date, datetime
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import Optional, Union
-from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional, Union
 from pydantic import BaseModel
+from urllib.parse import urlsplit, urljoin, parse_qsl, urlencode
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+class _LazyModule:
+    """Module importé au premier accès à un attribut, qui remplace alors ce
+    proxy dans les globales : numpy et plotly ne coûtent rien au démarrage d'un
+    worker tant qu'aucun graphique ni calcul n'est demandé."""
+
+    def __init__(self, name: str, alias: str):
+        self._name, self._alias = name, alias
+
+    def __getattr__(self, attr: str):
+        mod = importlib.import_module(self._name)   # verrou d'import : sûr entre threads
+        globals()[self._alias] = mod
+        return getattr(mod, attr)
+
+np = _LazyModule("numpy", "np")
+go = _LazyModule("plotly.graph_objects", "go")
+
+# Registre des expressions des parseurs, toutes compilées à l'import (~2 ms) :
+# aucune compilation ni passage par le cache de `re` sur le chemin d'une requête
+PATTERNS: dict[str, re.Pattern] = {}
+
+def pattern(name: str, src: str, flags: int = 0) -> re.Pattern:
+    PATTERNS[name] = p = re.compile(src, flags)
+    return p
 
 # ── 1. PARSEUR ───────────────────────────────────────────────────────────────
 
@@ -34,36 +83,125 @@ class Performance:
     competition: str
     lien_resultats: str
     splits: list[Split] = field(default_factory=list)
+    temps_cs: Optional[int] = None   # renseignés par normalize_perf (None = illisible)
+    date_ord: Optional[int] = None
+
+_CELL_RE    = pattern("cell", r"<(t[dh])\b([^>]*)>(.*?)</t[dh]>", re.DOTALL)
+_TAGS_RE    = pattern("tags", r"<[^>]+>")
+_TIPPY_RE   = pattern("tippy", r"""data-tippy-content=['"]([^'"]*)['"]""")
+_HREF_RE    = pattern("href", r"""href=["']([^"']+)["']""")
+_P_RE       = pattern("p", r"<p[^>]*>(.*?)</p>", re.DOTALL)
+_DIGITS_RE  = pattern("digits", r"(\d+)")
+_DATE_RE    = pattern("date", r"(\d{1,2})/(\d{1,2})/(\d{4})")   # JJ/MM/AAAA, comme strptime("%d/%m/%Y")
+_RARE_ENTITY_RE = pattern("rare_entity", r"&(?!lt;|gt;|quot;|amp;|#0?39;)")
+# Cellule : même contenu que _CELL_RE, sans retour arrière caractère par caractère
+_INNER = r"([^<]*(?:<(?!/t[dh]>)[^<]*)*)</t[dh]>"
+_PERF_ROW_RE = pattern("perf_row", rf"\s*<th\b[^>]*>{_INNER}" + rf"\s*<td\b[^>]*>{_INNER}" * 8)
+# Passage d'un tippy : distance, cumul, (temps au 50), [temps au 100] ; valeurs sans blanc ni entité
+_SPLIT_RE = pattern("split", r"<td\b[^>]*>\s*(\d+)[^<]*</td>\s*<td\b[^>]*>\s*([^<\s&]*)\s*</td>"
+                             r"\s*<td\b[^>]*>\s*\(?([^<\s&()]*)\)?\s*</td>"
+                             r"(?:\s*(<td)\b[^>]*>\s*\[?([^<\s&\[\]]*)\]?\s*</td>)?")
 
 def strip_tags(text: str) -> str:
-    return re.sub(r"\s+", " ", re.sub(r"<[^>]+>", "", text)).strip()
-
-def find_all(pattern: str, text: str) -> list[str]:
-    return re.findall(pattern, text, re.DOTALL)
-
-def find_one(pattern: str, text: str, default: str = "") -> str:
-    m = re.search(pattern, text, re.DOTALL)
-    return m.group(1).strip() if m else default
-
-def extract_split_from_cells(cells: list[str], offset: int) -> Optional[Split]:
+    if "<" in text: text = _TAGS_RE.sub("", text)
+    return " ".join(text.split())
+
+def unescape_attr(text: str) -> str:
+    """html.unescape, en raccourci quand seules les entités de base sont présentes (cas des tippys)."""
+    if "&" not in text: return text
+    if _RARE_ENTITY_RE.search(text): return html.unescape(text)
+    return (text.replace("&lt;", "<").replace("&gt;", ">").replace("&quot;", '"')
+                .replace("&#039;", "'").replace("&#39;", "'").replace("&amp;", "&"))
+
+class Cell:
+    """Cellule <td>/<th> : attributs bruts + HTML interne, texte calculé à la demande."""
+    __slots__ = ("tag", "attrs", "inner", "_text")
+
+    def __init__(self, tag: str, attrs: str, inner: str):
+        self.tag, self.attrs, self.inner, self._text = tag, attrs, inner, None
+
+    @property
+    def text(self) -> str:
+        if self._text is None: self._text = strip_tags(self.inner)
+        return self._text
+
+class Row:
+    """Ligne <tr> : attributs et HTML brut ; les cellules ne sont découpées qu'au premier accès."""
+    __slots__ = ("attrs", "raw", "_cells")
+
+    def __init__(self, attrs: str, raw: str):
+        self.attrs, self.raw, self._cells = attrs, raw, None
+
+    @property
+    def cells(self) -> list:
+        if self._cells is None:
+            self._cells = [Cell(tag, attrs, inner) for tag, attrs, inner in _CELL_RE.findall(self.raw)]
+        return self._cells
+
+    @property
+    def tds(self) -> list:
+        return [c for c in self.cells if c.tag == "td"]
+
+    @property
+    def ths(self) -> list:
+        return [c for c in self.cells if c.tag == "th"]
+
+def iter_rows(page: str, start: int = 0):
+    """Parcourt la page une seule fois (recherche de sous-chaînes, pas de regex)
+    et émet chaque <tr> au fil de l'eau. Même découpage que <tr[^>]*>(.*?)</tr>."""
+    find = page.find
+    pos = start
+    while True:
+        i = find("<tr", pos)
+        if i < 0: return
+        j = find(">", i)
+        if j < 0: return
+        if page[i+3] not in " \t\r\n>/":   # <track>, etc.
+            pos = i + 3
+            continue
+        k = find("</tr>", j)
+        if k < 0: k = len(page)
+        yield Row(page[i+3:j], page[j+1:k])
+        pos = k + 5
+
+def row_at(page: str, pos: int) -> Optional[Row]:
+    """La ligne qui contient l'index pos, sans parcourir le reste de la page."""
+    i = page.rfind("<tr", 0, pos)
+    while i >= 0 and page[i+3] not in " \t\r\n>":
+        i = page.rfind("<tr", 0, i)
+    if i < 0 or page.rfind("</tr>", i, pos) >= 0: return None
+    return next(iter_rows(page, i), None)
+
+def extract_split_from_cells(cells: list, offset: int) -> Optional[Split]:
     if offset + 3 > len(cells): return None
-    dist_text = strip_tags(cells[offset])
-    dist_match = re.match(r"(\d+)", dist_text)
+    dist_match = _DIGITS_RE.match(cells[offset].text)
     if not dist_match: return None
     return Split(
         distance_m=int(dist_match.group(1)),
-        cumulative_time=strip_tags(cells[offset+1]),
-        lap_time=strip_tags(cells[offset+2]).replace("(", "").replace(")", ""),
-        half_time=strip_tags(cells[offset+3]).replace("[", "").replace("]", "") if offset + 3 < len(cells) else None
+        cumulative_time=cells[offset+1].text,
+        lap_time=cells[offset+2].text.replace("(", "").replace(")", ""),
+        half_time=cells[offset+3].text.replace("[", "").replace("]", "") if offset + 3 < len(cells) else None
     )
 
 def parse_splits(tippy_raw: str) -> list[Split]:
-    decoded = html.unescape(tippy_raw)
+    """Tableau de passages d'un tippy. Chemin rapide : une expression par passage
+    sur le tippy décodé, deux passages par ligne de part et d'autre de la bordure.
+    Si une cellule <td> reste hors d'un passage reconnu (balises, entités) ou qu'une
+    ligne à deux passages n'a pas de bordure, découpage générique par Row/Cell."""
+    table = tippy_raw.replace("&lt;", "<").replace("&gt;", ">")
+    splits, n_tds = [], 0
+    for dist, cumul, lap, td, half in _SPLIT_RE.findall(table):
+        n_tds += 4 if td else 3
+        splits.append(Split(int(dist), cumul, lap, half if td else None))
+    if n_tds != table.count("<td") or len(splits) - table.count("<tr") > table.count("border-right"):
+        return _parse_splits_cells(tippy_raw)
+    return sorted(splits, key=lambda s: s.distance_m)
+
+def _parse_splits_cells(tippy_raw: str) -> list[Split]:
     splits = []
-    for row in find_all(r"<tr[^>]*>(.*?)</tr>", decoded):
-        cells = find_all(r"<td[^>]*>(.*?)</td>", row)
-        raw_td_attrs = find_all(r"<td([^>]*)>", row)
-        separator_idx = next((i for i, attrs in enumerate(raw_td_attrs) if "border-right" in attrs), None)
+    for row in iter_rows(unescape_attr(tippy_raw)):
+        cells = row.tds
+        separator_idx = next((i for i, c in enumerate(cells) if "border-right" in c.attrs), None)
         if separator_idx is not None:
             left  = extract_split_from_cells(cells, 0)
             right = extract_split_from_cells(cells, separator_idx + 1)
@@ -74,28 +212,76 @@ def parse_splits(tippy_raw: str) -> list[Split]:
             if s: splits.append(s)
     return sorted(splits, key=lambda s: s.distance_m)
 
-def parse_row(row: str, base_url: str = "https://ffn.extranat.fr") -> Optional[Performance]:
-    th = find_one(r"<th[^>]*>(.*?)</th>", row)
-    if not th: return None
-    tds = find_all(r"<td[^>]*>(.*?)</td>", row)
+def perf_from_row(row: Row, base_url: str = "https://ffn.extranat.fr") -> Optional[Performance]:
+    """Une ligne au format attendu (<th> puis 8 <td>) est lue d'une seule expression,
+    sans objets Cell ; les autres passent par le découpage en cellules."""
+    m = _PERF_ROW_RE.match(row.raw)
+    if m: return perf_from_cells(m[1], m.groups()[1:], base_url) if m[1].strip() else None
+    ths = row.ths
+    if not ths or not ths[0].inner.strip(): return None
+    tds = row.tds
     if len(tds) < 8: return None
-    tippy_match = re.search(r'data-tippy-content=[\'"]([^\'"]*)[\'"]', tds[0])
-    splits = parse_splits(tippy_match.group(1)) if tippy_match else []
-    ps = find_all(r"<p[^>]*>(.*?)</p>", tds[3])
+    return perf_from_cells(ths[0].inner, [td.inner for td in tds[:8]], base_url)
+
+def perf_from_cells(th: str, tds: list, base_url: str = "https://ffn.extranat.fr") -> Performance:
+    """Performance depuis le HTML interne de l'épreuve (<th>) et des 8 premiers <td>."""
+    i = tds[0].find("data-tippy-content=")   # ancre la recherche : le tippy fait l'essentiel de la cellule
+    tippy = _TIPPY_RE.match(tds[0], i) if i >= 0 else None
+    splits = parse_splits(tippy.group(1)) if tippy else []
+    club_html = tds[3]
+    parts = club_html.split("<p")
+    p = _P_RE.search(club_html)
+    href = _HREF_RE.search(tds[6])
     return Performance(
         epreuve=strip_tags(th),
         temps_final=strip_tags(tds[0]),
         age_categorie=strip_tags(tds[1]).strip("()"),
         points=strip_tags(tds[2]),
-        club=strip_tags(tds[3].split("<p")[0]),
-        pays=strip_tags(tds[3].split("<p")[2]) if len(tds[3].split("<p")) > 2 else "",
+        club=strip_tags(parts[0]),
+        pays=strip_tags(parts[2]) if len(parts) > 2 else "",
         date=strip_tags(tds[4]),
         type_compet=strip_tags(tds[5]),
-        competition=strip_tags(ps[0]) if ps else strip_tags(tds[3]),
-        lien_resultats=base_url + find_one(r'href=["\']([^"\']+)["\']', tds[6]),
+        competition=strip_tags(p.group(1)) if p else strip_tags(club_html),
+        lien_resultats=base_url + (href.group(1).strip() if href else ""),
         splits=splits
     )
 
+def parse_row(row: str, base_url: str = "https://ffn.extranat.fr") -> Optional[Performance]:
+    """Adaptateur : contenu HTML d'un <tr> isolé."""
+    return next((perf_from_row(r, base_url) for r in iter_rows(f"<tr>{row}</tr>")), None)
+
+def iter_performances(page: str, base_url: str = "https://ffn.extranat.fr"):
+    """Performances normalisées d'une page nat_recherche (lignes <tr class="... border-b ...">)."""
+    for row in iter_rows(page):
+        if "border-b" in row.attrs and "class=" in row.attrs:
+            perf = perf_from_row(row, base_url)
+            if perf: yield normalize_perf(perf)
+
+# ── Normalisation (une seule fois, à l'ingestion) ──
+
+def parse_time_cs(t: str) -> Optional[int]:
+    """'1:05.33' / '00:58.10' / '27.4' → centièmes ; None si illisible."""
+    try:
+        m, _, sec = t.replace(" ", "").rpartition(":")
+        return round((int(m) * 60 if m else 0) * 100 + float(sec) * 100)
+    except ValueError:
+        return None
+
+def parse_date_ord(d: str) -> Optional[int]:
+    m = _DATE_RE.fullmatch(d.strip())
+    try: return date(int(m[3]), int(m[2]), int(m[1])).toordinal() if m else None
+    except ValueError: return None
+
+def format_cs(cs: int) -> str:
+    """Centièmes → format FFN MM:SS.ss (00:SS.ss sous la minute)."""
+    m, rest = divmod(cs, 6000)
+    return f"{m:02d}:{rest // 100:02d}.{rest % 100:02d}"
+
+def normalize_perf(p: Performance) -> Performance:
+    p.temps_cs = parse_time_cs(p.temps_final)
+    p.date_ord = parse_date_ord(p.date)   # None = illisible, écarté des calculs
+    return p
+
 # ── 2. TYPES REFLEX ──────────────────────────────────────────────────────────
 
 class SplitRow(BaseModel):
@@ -103,6 +289,23 @@ class SplitRow(BaseModel):
     cumul:   str
     partiel: str
     half:    str
+    ecart:   str = ""   # écart au cumul du record à ce passage ("+1.23s")
+
+class RankSeason(BaseModel):
+    saison:   str
+    dept:     str
+    region:   str
+    national: str
+
+class QualifRow(BaseModel):
+    nom:      str
+    epreuve:  str
+    grille:   str
+    meilleur: str
+    cible:    str
+    ecart:    str
+    pct:      str
+    ok:       bool
 
 class Top10Entry(BaseModel):
     rang:  str
@@ -110,15 +313,27 @@ class Top10Entry(BaseModel):
     temps: str
     moi:   bool
 
+class ResultRow(BaseModel):
+    """Ligne du tableau de la page nage : seulement ce qui est affiché ou renvoyé au clic."""
+    id: str
+    D:  str
+    T:  str
+    P:  str
+    N:  str
+    V:  str
+    pb: bool
+
 class Result(BaseModel):
+    id: str
     E: str
     T: str
     P: str
     D: str
     B: str
-    S: str
     N: str
     V: str
+    cs: Optional[int] = None   # temps en centièmes (None = illisible)
+    do: Optional[int] = None   # date ordinale
 
 # ── 3. CONSTANTES ────────────────────────────────────────────────────────────
 
@@ -130,9 +345,32 @@ GRILLE_QUALIF_FULL = {
     "U18": {"50 NL": "24.12", "100 NL": "52.84", "200 NL": "1:55.48", "400 NL": "4:02.58", "800 NL": "8:25.11", "1500 NL": "16:02.04", "50 Dos": "27.69", "100 Dos": "59.70", "200 Dos": "2:10.64", "50 Bra": "30.10", "100 Bra": "1:06.34", "200 Bra": "2:26.62", "50 Pap": "25.55", "100 Pap": "57.14", "200 4 N": "2:10.50", "400 4 N": "4:39.07"},
 }
 
-BIRTH_YEAR = 2011
-SEP_CHAMP  = "§"
-SEP_SPLIT  = ";"
+# Grilles de qualification : nom → (libellé, bassin, saison ou None = toutes, {catégorie: {épreuve: temps}}).
+# D'autres grilles (régionales, d'une saison donnée) s'ajoutent ici, ou dans le
+# fichier JSON QUALIF_GRIDS_PATH : {nom: {"label", "bassin", "saison", "grille"}}.
+QUALIF_GRIDS = {
+    "france": ("France", "50m", None, GRILLE_QUALIF_FULL),
+}
+QUALIF_GRIDS_PATH = os.environ.get("QUALIF_GRIDS_PATH", "qualif_grids.json")
+QUALIF_MARGINS = (2, 5, 10)   # marges proposées sur /qualif (% au-dessus du temps limite)
+
+@dataclass(frozen=True)
+class Swimmer:
+    id: str
+    nom: str
+    birth_year: int
+
+# Nageurs suivis (un club entier peut être ajouté ici)
+ROSTER = [
+    Swimmer("3518107", "Tristan", 2011),
+]
+ROSTER_BY_ID = {s.id: s for s in ROSTER}
+
+# Périmètres des classements : Isère / AURA
+DEPT_ID   = 1611
+REGION_ID = 3004
+SCOPE_SUFFIX = {"national": "", "region": f"&idreg={REGION_ID}", "dept": f"&iddep={DEPT_ID}"}
+
 
 # Codes épreuves FFN
 EPREUVE_CODES = {
@@ -147,95 +385,2130 @@ def current_season_year() -> int:
     """idsai = année civile courante."""
     return datetime.now().year
 
-def parse_ranking_row(html_content: str, swimmer_id: str = "3518107") -> dict:
-    """Extrait les 6 rangs (par cat + TC) depuis la page de classement FFN."""
+# Surchargeable pour viser un serveur local (bench, développement hors ligne)
+FFN_BASE = os.environ.get("FFN_BASE_URL", "https://ffn.extranat.fr").rstrip("/")
+
+def perf_url(swimmer_id: str, bc: str) -> str:
+    return f"{FFN_BASE}/webffn/nat_recherche.php?idact=nat&idrch_id={swimmer_id}&idopt=prf&idbas={bc}"
+
+def ranking_url(bc: str, idepr: int, sai: int, cat: Optional[int], scope: str) -> str:
+    """Page de classement ; scope en '_tc' (toutes catégories) = sans idcat."""
+    base = f"{FFN_BASE}/webffn/nat_rankings.php?idact=nat&idopt=sai&go=epr&idbas={bc}&idepr={idepr}&idsai={sai}"
+    if not scope.endswith("_tc"): base += f"&idcat={cat}"
+    return base + SCOPE_SUFFIX[scope.replace("_tc", "")]
+
+
+_TIPPY_DQ_RE = pattern("tippy_dq", r'data-tippy-content="(.*?)"(?:\s|>)', re.DOTALL)
+_TIPPY_SQ_RE = pattern("tippy_sq", r"data-tippy-content='(.*?)'(?:\s|>)", re.DOTALL)
+_RANK_RES = {
+    "national":    pattern("rank_national", r"Rang national par cat[^→]*→\s*<b>(.*?)</b>", re.DOTALL),
+    "region":      pattern("rank_region", r"Rang r[ée]gional[^→]*par cat[^→]*→\s*<b>(.*?)</b>", re.DOTALL),
+    "dept":        pattern("rank_dept", r"Rang d[ée]part[^→]*par cat[^→]*→\s*<b>(.*?)</b>", re.DOTALL),
+    "national_tc": pattern("rank_national_tc", r"Rang national toutes cat[^→]*→\s*<b>(.*?)</b>", re.DOTALL),
+    "region_tc":   pattern("rank_region_tc", r"Rang r[ée]gional[^→]*toutes cat[^→]*→\s*<b>(.*?)</b>", re.DOTALL),
+    "dept_tc":     pattern("rank_dept_tc", r"Rang d[ée]part[^→]*toutes cat[^→]*→\s*<b>(.*?)</b>", re.DOTALL),
+}
+_BIRTH_SUFFIX_RE = pattern("birth_suffix", r"\s*\(\d{4}\s*/\s*\d+\s*ans\)\s*[A-Z]{2,3}\s*$")
+
+def ranks_from_row(row: Row) -> dict:
+    """Les 6 rangs contenus dans le tippy « Rang … » d'une ligne de classement."""
     result = {"dept": "-", "region": "-", "national": "-",
               "dept_tc": "-", "region_tc": "-", "national_tc": "-"}
-    rows = find_all(r"<tr[^>]*>(.*?)</tr>", html_content)
-    target_row = next((r for r in rows if swimmer_id in r), None)
-    if not target_row:
+    all_tippies = _TIPPY_DQ_RE.findall(row.raw) or _TIPPY_SQ_RE.findall(row.raw)
+    tippy = next((t for t in map(unescape_attr, all_tippies) if "Rang" in t), None)
+    if not tippy:
         return result
-    all_tippies = re.findall(r'data-tippy-content="(.*?)"(?:\s|>)', target_row, re.DOTALL)
-    if not all_tippies:
-        all_tippies = re.findall(r"data-tippy-content='(.*?)'(?:\s|>)", target_row, re.DOTALL)
-    raw_tippy = next((t for t in all_tippies if "Rang" in html.unescape(t)), None)
-    if not raw_tippy:
-        return result
-    tippy = html.unescape(raw_tippy)
-
-    def extract_rank(pattern):
-        m = re.search(pattern, tippy, re.DOTALL)
-        if not m: return "-"
-        clean = re.sub(r"<[^>]+>", "", m.group(1)).strip()
-        return clean.split(" : ")[0].strip()
-
-    result["national"]    = extract_rank(r"Rang national par cat[^→]*→\s*<b>(.*?)</b>")
-    result["region"]      = extract_rank(r"Rang r[ée]gional[^→]*par cat[^→]*→\s*<b>(.*?)</b>")
-    result["dept"]        = extract_rank(r"Rang d[ée]part[^→]*par cat[^→]*→\s*<b>(.*?)</b>")
-    result["national_tc"] = extract_rank(r"Rang national toutes cat[^→]*→\s*<b>(.*?)</b>")
-    result["region_tc"]   = extract_rank(r"Rang r[ée]gional[^→]*toutes cat[^→]*→\s*<b>(.*?)</b>")
-    result["dept_tc"]     = extract_rank(r"Rang d[ée]part[^→]*toutes cat[^→]*→\s*<b>(.*?)</b>")
+    for scope, rx_rank in _RANK_RES.items():
+        m = rx_rank.search(tippy)
+        if m: result[scope] = strip_tags(m.group(1)).split(" : ")[0].strip()
     return result
 
-def parse_top10(html_content: str, swimmer_id: str = "3518107") -> list:
-    """Extrait les 10 premiers nageurs du classement. Marque Tristan avec is_tristan=True."""
+def find_id(text: str, sid: str, start: int = 0) -> int:
+    """Position de l'identifiant sid dans text, non collé à d'autres chiffres (-1 sinon)."""
+    n = len(sid)
+    pos = text.find(sid, start)
+    while pos >= 0 and ((pos and text[pos-1].isdigit()) or text[pos+n:pos+n+1].isdigit()):
+        pos = text.find(sid, pos + 1)
+    return pos
+
+def parse_ranking_row(html_content: str, swimmer_id: str) -> dict:
+    """Extrait les 6 rangs (par cat + TC) depuis la page de classement FFN."""
+    pos = find_id(html_content, swimmer_id)
+    target_row = None
+    while pos >= 0 and target_row is None:
+        target_row = row_at(html_content, pos)
+        pos = find_id(html_content, swimmer_id, pos + 1)
+    if not target_row:
+        return {"dept": "-", "region": "-", "national": "-",
+                "dept_tc": "-", "region_tc": "-", "national_tc": "-"}
+    return ranks_from_row(target_row)
+
+def parse_rankings(html_content: str, swimmer_ids) -> dict:
+    """Rangs de plusieurs nageurs du roster depuis la même page."""
+    return {sid: parse_ranking_row(html_content, sid) for sid in swimmer_ids}
+
+def top10_from_row(row: Row, swimmer_ids=()) -> Optional[dict]:
+    tds, ths = row.tds, row.ths
+    if not tds or not ths: return None
+    rang = tds[0].text.rstrip(".")
+    if not rang.isdigit(): return None
+    nom = " ".join(_BIRTH_SUFFIX_RE.sub("", ths[0].text).split())
+    # Extraire temps (3e td généralement)
+    temps = tds[2].text if len(tds) > 2 else "-"
+    sid = next((i for i in swimmer_ids if find_id(row.raw, i) >= 0), "")
+    return {"rang": rang, "nom": nom, "temps": temps, "id": sid}
+
+def parse_top10(html_content: str, swimmer_ids=()) -> list:
+    """Extrait les 10 premiers nageurs du classement. « id » = membre du roster présent, sinon ""."""
     result = []
-    rows = find_all(r"<tr[^>]*>(.*?)</tr>", html_content)
-    count = 0
-    for row in rows:
-        tds = find_all(r"<td[^>]*>(.*?)</td>", row)
-        ths = find_all(r"<th[^>]*>(.*?)</th>", row)
-        if not tds or not ths: continue
-        rang = strip_tags(tds[0]).rstrip(".")
-        if not rang.isdigit(): continue
-        nom = strip_tags(ths[0])
-        try:
-            nom = re.sub(r'\s*\(\d{4}\s*/\s*\d+\s*ans\)\s*[A-Z]{2,3}\s*$', '', nom)
-            nom = re.sub(r'\s+', ' ', nom).strip()
-        except:
-            pass
-        # Extraire temps (4e td généralement)
-        temps = strip_tags(tds[2]) if len(tds) > 2 else "-"
-        is_tristan = swimmer_id in row
-        result.append({"rang": rang, "nom": nom, "temps": temps, "moi": is_tristan})
-        count += 1
-        if count >= 10: break
+    for row in iter_rows(html_content):
+        entry = top10_from_row(row, swimmer_ids)
+        if entry:
+            result.append(entry)
+            if len(result) >= 10: break
     return result
 
+# ── Classement national complet : rangs et top N dérivés localement ────────────
+
+_ROW_ID_RE    = pattern("row_id", r"idrch_id=(\d+)")
+_ROW_CLUB_RE  = pattern("row_club", r"idclb=(\d+)[^>]*>(.*?)</a>", re.DOTALL)
+_ROW_DEPT_RE  = pattern("row_dept", r"iddep=(\d+)")
+_ROW_REG_RE   = pattern("row_reg", r"idreg=(\d+)")
+_ROW_BIRTH_RE = pattern("row_birth", r"\((\d{4})\s*/")
+NO_RANKS = {"dept": "-", "region": "-", "national": "-", "dept_tc": "-", "region_tc": "-", "national_tc": "-"}
+
+class RankingTable:
+    """Classement national « toutes catégories » d'une épreuve, une ligne par nageur,
+    en colonnes numpy. Catégorie (année de naissance), département et région sont
+    des attributs de ligne : rangs et top N de n'importe quel périmètre s'obtiennent
+    en filtrant puis reclassant, sans refetcher les pages iddep/idreg/idcat.
+    Si la page ne porte pas ces attributs, les rangs du roster retombent sur le
+    tippy FFN (ffn_ranks) et les tops concernés sur leurs pages (ranking_tops)."""
+    __slots__ = ("ids", "noms", "temps", "time_cs", "birth", "club", "dept", "region", "has_geo", "has_birth", "ffn_ranks")
+
+    def __init__(self, rows: list, ffn_ranks: dict):
+        cols = list(zip(*rows)) or [()] * 8
+        self.ids     = np.array(cols[0], dtype=object)
+        self.noms    = np.array(cols[1], dtype=object)
+        self.temps   = np.array(cols[2], dtype=object)
+        self.time_cs = np.array(cols[3], dtype=np.int32)
+        self.birth   = np.array(cols[4], dtype=np.int16)
+        self.club    = np.array(cols[5], dtype=object)
+        self.dept    = np.array(cols[6], dtype=np.int32)
+        self.region  = np.array(cols[7], dtype=np.int32)
+        self.has_geo = bool(len(self.dept)) and bool((self.dept > 0).any() or (self.region > 0).any())
+        self.has_birth = bool(len(self.birth)) and bool((self.birth > 0).all())
+        self.ffn_ranks = ffn_ranks
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def derives(self, scope: str) -> bool:
+        """Top de ce périmètre calculable depuis cette page ?"""
+        return ((scope.endswith("_tc") or self.has_birth)
+                and (scope.startswith("national") or self.has_geo))
+
+    def mask(self, scope: str, sai: int, cat: int, dept: int = DEPT_ID, region: int = REGION_ID) -> np.ndarray:
+        base = scope.replace("_tc", "")
+        m = np.ones(len(self), dtype=bool) if scope.endswith("_tc") else self.birth == sai - cat
+        if base == "dept":   m &= self.dept == dept
+        if base == "region": m &= self.region == region
+        return m
+
+    def ranks(self, swimmer_id: str, sai: int, cat: int) -> dict:
+        """Les 6 rangs d'un nageur dans son département et sa région, comme le tippy
+        FFN ; ex æquo = même rang (1 + nombre de temps strictement meilleurs)."""
+        hit = np.flatnonzero(self.ids == swimmer_id)
+        if not len(hit): return dict(NO_RANKS)
+        if not (self.has_geo and self.has_birth): return dict(self.ffn_ranks.get(swimmer_id, NO_RANKS))
+        i = hit[0]
+        where = {"dept": self.dept[i], "region": self.region[i]}
+        return {scope: str(int(np.count_nonzero(self.time_cs[self.mask(scope, sai, cat, **where)] < self.time_cs[i])) + 1)
+                for scope in NO_RANKS}
+
+    def top(self, scope: str, sai: int, cat: int, n: int = 10, swimmer_ids=(), **where) -> list:
+        """Même forme que parse_top10 : [{rang, nom, temps, id}] ; « id » = membre du roster, sinon ""."""
+        if not self.derives(scope): return []
+        idx = np.flatnonzero(self.mask(scope, sai, cat, **where))
+        idx = idx[np.argsort(self.time_cs[idx], kind="stable")]
+        times = self.time_cs[idx]
+        rangs = np.searchsorted(times, times[:n], side="left") + 1
+        ids = set(swimmer_ids)
+        return [{"rang": str(r), "nom": self.noms[i], "temps": self.temps[i], "id": self.ids[i] if self.ids[i] in ids else ""}
+                for r, i in zip(rangs.tolist(), idx[:n].tolist())]
+
+    def tops(self, sai: int, cat: int, n: int = 10, swimmer_ids=()) -> dict:
+        """Tops dérivables localement ; les autres périmètres sont absents de la réponse."""
+        return {scope: self.top(scope, sai, cat, n, swimmer_ids) for scope in NO_RANKS if self.derives(scope)}
+
+def parse_ranking_table(html_content: str, swimmer_ids=()) -> RankingTable:
+    """Toutes les lignes d'un classement (pas seulement les 10 premières) avec
+    temps, année de naissance, club, département et région ; rangs FFN du tippy
+    conservés pour les nageurs de swimmer_ids."""
+    rows, ffn_ranks = [], {}
+    for row in iter_rows(html_content):
+        tds, ths = row.tds, row.ths
+        if len(tds) < 3 or not ths or not tds[0].text.rstrip(".").isdigit(): continue
+        temps = tds[2].text
+        cs = parse_time_cs(temps)
+        if cs is None: continue
+        raw = row.raw
+        m = _ROW_ID_RE.search(raw)
+        sid = m.group(1) if m else ""
+        birth = _ROW_BIRTH_RE.search(ths[0].text)
+        club = _ROW_CLUB_RE.search(raw)
+        dept, reg = _ROW_DEPT_RE.search(raw), _ROW_REG_RE.search(raw)
+        rows.append((sid, " ".join(_BIRTH_SUFFIX_RE.sub("", ths[0].text).split()), temps, cs,
+                     int(birth.group(1)) if birth else 0, strip_tags(club.group(2)).strip() if club else "",
+                     int(dept.group(1)) if dept else 0, int(reg.group(1)) if reg else 0))
+        if sid and sid in swimmer_ids: ffn_ranks[sid] = ranks_from_row(row)
+    return RankingTable(rows, ffn_ranks)
+
+def roster_ranking_table(html_content: str) -> RankingTable:
+    return parse_ranking_table(html_content, {s.id for s in ROSTER})
+
+def roster_top10(html_content: str) -> list:
+    return parse_top10(html_content, [s.id for s in ROSTER])
+
+def ranking_table_url(bc: str, idepr: int, sai: int) -> str:
+    """L'unique page à fetcher par (épreuve, bassin, saison) : national toutes catégories."""
+    return ranking_url(bc, idepr, sai, None, "national_tc")
+
+# ── Métriques (texte Prometheus sur /metrics) ───────────────────────────────
+
+SPAN_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _labels(labels: tuple) -> str:
+    if not labels: return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in labels) + "}"
+
+class Metrics:
+    """Compteurs, jauges et histogrammes de durée en mémoire (par process).
+    Une série = (nom, étiquettes triées). Verrouillé : warm_up et build_snapshot
+    écrivent depuis des threads pendant que /metrics rend le registre."""
+
+    def __init__(self):
+        self.counters: dict[tuple, float] = {}
+        self.gauges: dict[tuple, float] = {}
+        self.hists: dict[tuple, list] = {}    # comptes par bucket (+Inf en dernier), puis somme et total
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock: self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_total(self, name: str, value: float, **labels):
+        """Compteur tenu ailleurs (stats du cache, du single-flight…), recopié au scrape."""
+        with self._lock: self.counters[(name, tuple(sorted(labels.items())))] = value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock: self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            h = self.hists.get(key)
+            if h is None: h = self.hists[key] = [0] * (len(SPAN_BUCKETS) + 3)
+            h[bisect.bisect_left(SPAN_BUCKETS, value)] += 1
+            h[-2] += value
+            h[-1] += 1
+
+    @contextlib.contextmanager
+    def span(self, name: str, **labels):
+        """Durée d'une étape → natation_span_seconds{span=name,...}, même en cas d'exception."""
+        t0 = time.perf_counter()
+        try: yield
+        finally: self.observe("natation_span_seconds", time.perf_counter() - t0, span=name, **labels)
+
+    def render(self) -> str:
+        with self._lock:
+            counters, gauges = dict(self.counters), dict(self.gauges)
+            hists = {k: list(h) for k, h in self.hists.items()}
+        out = []
+        for kind, series in (("counter", counters), ("gauge", gauges)):
+            for name in sorted({n for n, _ in series}):
+                out.append(f"# TYPE {name} {kind}")
+                out += [f"{name}{_labels(l)} {v:g}" for (n, l), v in sorted(series.items()) if n == name]
+        for name in sorted({n for n, _ in hists}):
+            out.append(f"# TYPE {name} histogram")
+            for (n, l), h in sorted(hists.items()):
+                if n != name: continue
+                for le, c in zip((*SPAN_BUCKETS, "+Inf"), itertools.accumulate(h[:-2])):
+                    out.append(f"{name}_bucket{_labels(l + (('le', le),))} {c}")
+                out += [f"{name}_sum{_labels(l)} {h[-2]:.6f}", f"{name}_count{_labels(l)} {h[-1]}"]
+        return "\n".join(out) + "\n"
+
+METRICS = Metrics()
+
+DELTA_SAMPLE = float(os.environ.get("METRICS_DELTA_SAMPLE", "0.1"))
+
+def metrics_text() -> str:
+    """Recopie les stats tenues ailleurs (cache, single-flight, préchargement, store) puis rend /metrics."""
+    for k, v in CACHE.stats.items():
+        METRICS.set_total("natation_cache_events_total", v, event=k)
+    for k, v in FLIGHT_STATS.items():
+        if k == "max_waiters": METRICS.set("natation_singleflight_max_waiters", v)
+        else: METRICS.set_total("natation_singleflight_total", v, kind=k)
+    METRICS.set("natation_singleflight_coalescing_ratio", coalescing_ratio())
+    for k in ("fetched", "already_stored", "errors"):
+        METRICS.set_total("natation_prefetch_total", sum(p.stats[k] for p in list(_PREFETCHERS.values())), kind=k)
+    METRICS.set("natation_fetch_concurrency_limit", FETCH_CONTROL.limit)
+    METRICS.set("natation_fetch_inflight", FETCH_CONTROL.inflight)
+    for k, v in FETCH_CONTROL.stats.items():
+        METRICS.set_total("natation_fetch_control_total", v, event=k)
+    for family, v in list(FETCH_CONTROL.baselines.items()):
+        METRICS.set("natation_fetch_latency_baseline_seconds", v, family=family)
+    METRICS.set("natation_store_version", STORE.version())
+    for d, v in STORE.versions().items(): METRICS.set("natation_store_domain_version", v, domain=d)
+    METRICS.set("natation_last_update_timestamp_seconds", STORE.last_update())
+    return METRICS.render()
+
+async def metrics_endpoint(request):
+    return PlainTextResponse(metrics_text(), media_type="text/plain; version=0.0.4")
+
+# ── Cache HTTP partagé (disque, toutes sessions / tous process) ──────────────
+
+CACHE_PATH      = os.environ.get("FFN_CACHE_PATH", "ffn_cache.db")
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+# TTL en secondes par famille d'URL (script FFN appelé)
+CACHE_TTL = {
+    "nat_rankings.php":  3600,
+    "nat_recherche.php": 900,
+}
+CACHE_TTL_DEFAULT = 600
+
+def normalize_url(url: str) -> str:
+    """Clé de cache : schéma/hôte en minuscules, paramètres triés, vides retirés."""
+    p = urlsplit(url)
+    q = urlencode(sorted(parse_qsl(p.query)))
+    return f"{p.scheme.lower()}://{p.netloc.lower()}{p.path}" + (f"?{q}" if q else "")
+
+def cache_ttl(url: str) -> int:
+    return CACHE_TTL.get(urlsplit(url).path.rsplit("/", 1)[-1], CACHE_TTL_DEFAULT)
 
-def encode_splits(splits: list[Split]) -> str:
-    return SEP_SPLIT.join(
-        f"{s.distance_m}{SEP_CHAMP}{s.cumulative_time}{SEP_CHAMP}{s.lap_time}{SEP_CHAMP}{s.half_time or ''}"
-        for s in splits
+@dataclass
+class CacheEntry:
+    body: str
+    etag: str
+    last_modified: str
+    fetched_at: float
+
+class ResponseCache:
+    """Cache LRU borné en taille, stocké dans SQLite (pages compressées zlib)."""
+
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "stale_served": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""CREATE TABLE IF NOT EXISTS http_cache (
+                url TEXT PRIMARY KEY, body BLOB, etag TEXT, last_modified TEXT,
+                fetched_at REAL, accessed_at REAL, size INTEGER)""")
+            self._db.execute("CREATE INDEX IF NOT EXISTS http_cache_lru ON http_cache(accessed_at)")
+        return self._db
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        with self._lock:
+            db = self._conn()
+            row = db.execute("SELECT body, etag, last_modified, fetched_at FROM http_cache WHERE url=?", (url,)).fetchone()
+            if not row: return None
+            db.execute("UPDATE http_cache SET accessed_at=? WHERE url=?", (time.time(), url))
+        return CacheEntry(zlib.decompress(row[0]).decode("utf-8"), row[1] or "", row[2] or "", row[3])
+
+    def put(self, url: str, body: str, etag: str = "", last_modified: str = ""):
+        blob = zlib.compress(body.encode("utf-8"), 6)
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            db.execute("INSERT OR REPLACE INTO http_cache VALUES (?,?,?,?,?,?,?)",
+                       (url, blob, etag, last_modified, now, now, len(blob)))
+            self._evict(db)
+
+    def touch(self, url: str):
+        """Réponse 304 : l'entrée redevient fraîche."""
+        now = time.time()
+        with self._lock:
+            self._conn().execute("UPDATE http_cache SET fetched_at=?, accessed_at=? WHERE url=?", (now, now, url))
+
+    def _evict(self, db: sqlite3.Connection):
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM http_cache").fetchone()[0]
+        if total <= self.max_bytes: return
+        for url, size in db.execute("SELECT url, size FROM http_cache ORDER BY accessed_at").fetchall():
+            db.execute("DELETE FROM http_cache WHERE url=?", (url,))
+            self.stats["evictions"] += 1
+            total -= size
+            if total <= self.max_bytes: break
+
+CACHE = ResponseCache()
+
+# ── Corpus de pages enregistrées (rejouées par ffn_stub.py) ─────────────────
+
+def corpus_key(url: str) -> str:
+    """Page + paramètres triés, indépendante de l'hôte : même clé pour le vrai site et le stub."""
+    p = urlsplit(url)
+    return p.path.rsplit("/", 1)[-1] + "?" + urlencode(sorted(parse_qsl(p.query)))
+
+class Corpus:
+    """Répertoire de pages FFN : un fichier <hash>.html par clé, et index.json
+    (clé → fichier, URL d'origine, date d'enregistrement)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        try:
+            with open(os.path.join(path, "index.json"), encoding="utf-8") as f:
+                self.index = json.load(f)
+        except FileNotFoundError:
+            self.index = {}
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self.index.get(key)
+        if not entry: return None
+        with open(os.path.join(self.path, entry["file"]), encoding="utf-8") as f:
+            return f.read()
+
+    def keys(self, page: str = "") -> list:
+        return sorted(k for k in self.index if k.startswith(page))
+
+    def put(self, url: str, body: str):
+        key = corpus_key(url)
+        name = hashlib.sha1(key.encode()).hexdigest()[:16] + ".html"
+        with self._lock:
+            with open(os.path.join(self.path, name), "w", encoding="utf-8") as f:
+                f.write(body)
+            self.index[key] = {"file": name, "url": url, "recorded_at": int(time.time())}
+            tmp = os.path.join(self.path, "index.json.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.index, f, indent=1, sort_keys=True)
+            os.replace(tmp, os.path.join(self.path, "index.json"))
+
+# FFN_RECORD_DIR : chaque réponse 200 téléchargée est aussi enregistrée dans ce corpus
+RECORDER = Corpus(os.environ["FFN_RECORD_DIR"]) if os.environ.get("FFN_RECORD_DIR") else None
+
+FETCH_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "fr-FR,fr;q=0.9",
+    "Accept-Encoding": "gzip, deflate",
+    "Referer": "https://ffn.extranat.fr/webffn/nat_rankings.php",
+    "Connection": "keep-alive",
+}
+
+# ── Moteur HTTP asynchrone (pool keep-alive) ─────────────────────────────────
+
+FETCH_CONCURRENCY = 12   # plafond du contrôleur ; il démarre plus bas et s'ajuste
+FETCH_TIMEOUT     = 15
+FETCH_RETRIES     = 2
+FETCH_MAX_REDIRECTS = 5
+POOL_IDLE_TTL     = 10   # secondes avant de jeter une connexion inactive
+
+# Contrôle adaptatif (AIMD) : +1 requête simultanée par fenêtre saine, ×0.5 sur erreur
+# ou latence anormale, jamais plus de FETCH_MAX_RPS départs/s, pause sur Retry-After.
+# Le plafond est un garde-fou : un rafraîchissement (~40 pages) part dans la rafale
+# d'une seconde sans attendre, c'est l'AIMD qui règle le débit réel.
+FETCH_MIN_CONCURRENCY  = 1
+FETCH_INIT_CONCURRENCY = 4
+FETCH_MAX_RPS          = float(os.environ.get("FFN_MAX_RPS", "50"))
+FETCH_SLOW_FACTOR      = 3.0    # latence > 3× la référence = surcharge
+FETCH_MAX_RETRY_AFTER  = 120
+
+class FetchError(Exception):
+    def __init__(self, status: int, url: str, retry_after: float = 0.0):
+        super().__init__(f"HTTP {status} sur {url}")
+        self.status = status
+        self.retry_after = retry_after
+
+def parse_retry_after(value: str) -> float:
+    """Retry-After en secondes (entier ou date HTTP), borné ; 0 si absent ou illisible."""
+    if not value: return 0.0
+    try:
+        delay = float(value)
+    except ValueError:
+        try: delay = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError): return 0.0
+    return min(max(delay, 0.0), FETCH_MAX_RETRY_AFTER)
+
+class RateLimiter:
+    """Au plus `rate` départs par seconde en régime établi, dont `burst` peuvent
+    partir d'un coup après un temps calme (seau à jetons, forme GCRA). Le créneau
+    est réservé sous verrou de thread : utilisable depuis n'importe quelle boucle."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self.tolerance = (max(burst, 1) - 1) * self.interval
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    async def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            self._next = max(now, self._next)
+            delay = self._next - now - self.tolerance
+            self._next += self.interval
+        if delay > 0: await asyncio.sleep(delay)
+
+def url_family(url: str) -> str:
+    """Famille de pages (chemin) : une page de classement complète et une page de
+    perfs n'ont pas la même latence normale."""
+    return urlsplit(url).path
+
+def _wake(fut: asyncio.Future):
+    if not fut.done(): fut.set_result(None)
+
+class ConcurrencyController:
+    """Nombre de requêtes FFN simultanées piloté en AIMD à partir de la latence et
+    des erreurs observées, plus un plafond de requêtes/s et les pauses demandées
+    par le site (Retry-After). Un seul par process (FETCH_CONTROL), partagé par
+    toutes les boucles asyncio et tous les chemins de fetch ; les attentes sont
+    des futures de la boucle appelante, réveillées sans risque depuis une autre."""
+
+    def __init__(self, max_limit: int = FETCH_CONCURRENCY, initial: int = FETCH_INIT_CONCURRENCY,
+                 min_limit: int = FETCH_MIN_CONCURRENCY, rps: float = FETCH_MAX_RPS):
+        self.min_limit, self.max_limit = min_limit, max_limit
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.inflight = 0
+        self.baselines: dict[str, float] = {}   # latence de référence (minimum lissé) par famille d'URL
+        self.paused_until = 0.0
+        self._last_decrease = 0.0
+        self._rps = RateLimiter(rps, burst=int(rps))
+        self._lock = threading.Lock()
+        self._waiters: list[tuple] = []           # (boucle, future)
+        self.stats = {"increases": 0, "decreases": 0, "pauses": 0}
+
+    async def acquire(self):
+        while True:
+            with self._lock:
+                wait = self.paused_until - time.monotonic()
+                if wait <= 0 and self.inflight < int(self.limit):
+                    self.inflight += 1
+                    break
+                loop = asyncio.get_running_loop()
+                fut = loop.create_future()
+                self._waiters.append((loop, fut))
+            try: await asyncio.wait_for(fut, wait if wait > 0 else None)
+            except asyncio.TimeoutError: pass
+        try:
+            await self._rps.wait()
+        except BaseException:
+            # Annulé en attendant son créneau : le slot est rendu, sinon il fuit pour tout le process
+            with self._lock:
+                self.inflight -= 1
+                self._wake_all()
+            raise
+
+    async def release(self, latency: Optional[float], ok: bool, family: str = ""):
+        """latency=None : pas de réponse exploitable (timeout, socket coupé)."""
+        now = time.monotonic()
+        with self._lock:
+            base = self.baselines.get(family, 0.0)
+            if ok and latency is not None:
+                base = self.baselines[family] = latency if not base else min(latency, 0.9 * base + 0.1 * latency)
+            congested = not ok or (latency is not None and latency > FETCH_SLOW_FACTOR * max(base, 0.05))
+            if congested:
+                # Une seule baisse par aller-retour : un lot d'échecs simultanés ne divise pas 10 fois
+                if now - self._last_decrease > max(base, 0.1):
+                    self.limit = max(self.min_limit, self.limit / 2)
+                    self._last_decrease = now
+                    self.stats["decreases"] += 1
+            elif self.limit < self.max_limit:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                self.stats["increases"] += 1
+            self.inflight -= 1
+            self._wake_all()
+
+    def _wake_all(self):
+        for loop, fut in self._waiters:
+            if not loop.is_closed(): loop.call_soon_threadsafe(_wake, fut)
+        self._waiters.clear()
+
+    def pause(self, seconds: float):
+        if seconds <= 0: return
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.stats["pauses"] += 1
+
+FETCH_CONTROL = ConcurrencyController()
+
+# Sous-budget de débit du contexte courant (historique : FFN_BACKFILL_RPS), appliqué à
+# chaque requête HTTP, pages de repli et retries compris ; hérité par les tâches filles
+FETCH_BUDGET: contextvars.ContextVar[Optional[RateLimiter]] = contextvars.ContextVar("fetch_budget", default=None)
+
+
+@dataclass
+class _Conn:
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+    used_at: float = 0.0
+    reused: bool = False
+
+class AsyncFetcher:
+    """Client HTTP/1.1 minimal : connexions keep-alive réutilisées par hôte,
+    concurrence bornée, timeout par requête, retry avec jitter, gzip/deflate."""
+
+    def __init__(self, concurrency: int = FETCH_CONCURRENCY, timeout: float = FETCH_TIMEOUT, retries: int = FETCH_RETRIES,
+                 control: Optional[ConcurrencyController] = None):
+        self.timeout = timeout
+        self.retries = retries
+        self.pool_size = concurrency
+        self.control = control or FETCH_CONTROL   # sockets par boucle, contrôle par process
+        self._idle: dict[tuple, list[_Conn]] = {}
+        self._ssl = ssl.create_default_context()
+
+    async def get(self, url: str, headers: Optional[dict] = None) -> tuple:
+        """GET → (status, headers en minuscules, body str), redirections suivies
+        (FETCH_MAX_REDIRECTS sauts au plus). 304 n'est pas une erreur."""
+        for _ in range(FETCH_MAX_REDIRECTS + 1):
+            status, hdrs, body = await self._get(url, headers)
+            if status not in (301, 302, 303, 307, 308) or "location" not in hdrs:
+                return status, hdrs, body
+            METRICS.inc("natation_http_redirects_total")
+            url = urljoin(url, hdrs["location"])
+        raise FetchError(status, url)
+
+    async def _get(self, url: str, headers: Optional[dict] = None) -> tuple:
+        budget = FETCH_BUDGET.get()
+        for attempt in range(self.retries + 1):
+            try:
+                if budget: await budget.wait()
+                held, latency, ok = False, None, False
+                try:
+                    await self.control.acquire()   # rend lui-même le slot s'il est annulé en route
+                    held, t0 = True, time.perf_counter()
+                    status, hdrs, body = await asyncio.wait_for(self._request(url, headers or {}), self.timeout)
+                    latency, ok = time.perf_counter() - t0, status != 429 and status < 500
+                finally:
+                    if held: await self.control.release(latency, ok, url_family(url))
+                METRICS.inc("natation_http_responses_total", status=status)
+                if not ok: raise FetchError(status, url, parse_retry_after(hdrs.get("retry-after", "")))
+                return status, hdrs, body
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, FetchError) as e:
+                METRICS.inc("natation_fetch_errors_total", kind=type(e).__name__)
+                if attempt == self.retries: raise
+                METRICS.inc("natation_fetch_retries_total")
+                # Retry-After suspend tout le fetcher, pas seulement cette requête
+                retry_after = getattr(e, "retry_after", 0.0)
+                self.control.pause(retry_after)
+                await asyncio.sleep(max(retry_after, min(8.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.5)))
+
+    async def _request(self, url: str, headers: dict) -> tuple:
+        p = urlsplit(url)
+        https = p.scheme == "https"
+        key = (p.hostname, p.port or (443 if https else 80), https)
+        path = (p.path or "/") + (f"?{p.query}" if p.query else "")
+        host = p.hostname if p.port is None else f"{p.hostname}:{p.port}"
+        head = [f"GET {path} HTTP/1.1", f"Host: {host}"] + [f"{k}: {v}" for k, v in {**FETCH_HEADERS, **headers}.items()]
+        raw = ("\r\n".join(head) + "\r\n\r\n").encode("latin-1")
+        conn = await self._acquire(key)
+        try:
+            status, hdrs, body, keep = await self._roundtrip(conn, raw)
+        except (OSError, asyncio.IncompleteReadError):
+            conn.writer.close()
+            if not conn.reused: raise
+            # Connexion du pool fermée côté serveur : une seule relance sur socket neuf
+            conn = await self._acquire(key, fresh=True)
+            try:
+                status, hdrs, body, keep = await self._roundtrip(conn, raw)
+            except BaseException:
+                conn.writer.close()
+                raise
+        except BaseException:
+            conn.writer.close()
+            raise
+        if keep: self._release(key, conn)
+        else: conn.writer.close()
+        with METRICS.span("decode"):
+            text = _decode_body(body, hdrs.get("content-encoding", ""))
+        return status, hdrs, text
+
+    async def _acquire(self, key: tuple, fresh: bool = False) -> _Conn:
+        idle = self._idle.get(key, [])
+        now = time.monotonic()
+        while idle and not fresh:
+            conn = idle.pop()
+            if now - conn.used_at < POOL_IDLE_TTL and not conn.reader.at_eof():
+                conn.reused = True
+                return conn
+            conn.writer.close()
+        host, port, https = key
+        # Résolution puis connexion (TCP + TLS) chronométrées séparément
+        with METRICS.span("fetch.dns"):
+            infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        METRICS.inc("natation_http_connections_total")
+        with METRICS.span("fetch.connect"):
+            for i, (*_, addr) in enumerate(infos):
+                try:
+                    reader, writer = await asyncio.open_connection(addr[0], port, ssl=self._ssl if https else None,
+                                                                   server_hostname=host if https else None)
+                    break
+                except OSError:
+                    if i == len(infos) - 1: raise
+        return _Conn(reader, writer)
+
+    def _release(self, key: tuple, conn: _Conn):
+        idle = self._idle.setdefault(key, [])
+        if len(idle) >= self.pool_size:
+            conn.writer.close()
+            return
+        conn.used_at = time.monotonic()
+        idle.append(conn)
+
+    async def _roundtrip(self, conn: _Conn, raw: bytes) -> tuple:
+        t0 = time.perf_counter()
+        conn.writer.write(raw)
+        await conn.writer.drain()
+        r = conn.reader
+        status_line = await r.readline()
+        t1 = time.perf_counter()
+        METRICS.observe("natation_span_seconds", t1 - t0, span="fetch.ttfb")
+        if not status_line: raise asyncio.IncompleteReadError(b"", None)
+        version, status = status_line.split(None, 2)[:2]
+        status = int(status)
+        hdrs: dict[str, str] = {}
+        while True:
+            line = await r.readline()
+            if line in (b"\r\n", b"\n", b""): break
+            k, _, v = line.decode("latin-1").partition(":")
+            hdrs[k.strip().lower()] = v.strip()
+        keep = hdrs.get("connection", "").lower() != "close" and version != b"HTTP/1.0"
+        if status in (204, 304) or status < 200:
+            body = b""
+        elif "chunked" in hdrs.get("transfer-encoding", "").lower():
+            parts = []
+            while True:
+                size = int((await r.readline()).split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    while (await r.readline()) not in (b"\r\n", b"\n", b""): pass
+                    break
+                parts.append(await r.readexactly(size))
+                await r.readexactly(2)
+            body = b"".join(parts)
+        elif "content-length" in hdrs:
+            body = await r.readexactly(int(hdrs["content-length"]))
+        else:
+            body, keep = await r.read(), False
+        METRICS.observe("natation_span_seconds", time.perf_counter() - t1, span="fetch.body")
+        METRICS.inc("natation_http_received_bytes_total", len(body))
+        return status, hdrs, body, keep
+
+    async def aclose(self):
+        for conns in self._idle.values():
+            for c in conns: c.writer.close()
+        self._idle.clear()
+
+def _decode_body(body: bytes, encoding: str) -> str:
+    encoding = encoding.lower()
+    if encoding == "gzip":
+        body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    elif encoding == "deflate":
+        try: body = zlib.decompress(body)
+        except zlib.error: body = zlib.decompress(body, -zlib.MAX_WBITS)
+    return body.decode("utf-8", errors="replace")
+
+def _loop_local(registry: weakref.WeakKeyDictionary, factory):
+    """Un objet par boucle asyncio : sockets, files et futures y sont attachés."""
+    loop = asyncio.get_running_loop()
+    obj = registry.get(loop)
+    if obj is None:
+        obj = registry[loop] = factory()
+    return obj
+
+_FETCHERS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncFetcher]" = weakref.WeakKeyDictionary()
+
+def get_fetcher() -> AsyncFetcher:
+    return _loop_local(_FETCHERS, AsyncFetcher)
+
+# ── Single-flight : requêtes identiques simultanées → un seul téléchargement ──
+
+FLIGHT_STATS = {"calls": 0, "executions": 0, "coalesced": 0, "waiters": 0, "max_waiters": 0}
+
+class SingleFlight:
+    """Les appels concurrents de même clé partagent une seule exécution (et son
+    résultat ou son exception). L'annulation d'un appelant n'annule pas les autres."""
+
+    def __init__(self, stats: dict = FLIGHT_STATS):
+        self.stats = stats
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._waiters: dict[str, int] = {}
+
+    async def do(self, key: str, fn):
+        self.stats["calls"] += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.stats["executions"] += 1
+            task = self._inflight[key] = asyncio.ensure_future(fn())
+            self._waiters[key] = 0
+            task.add_done_callback(lambda _: (self._inflight.pop(key, None), self._waiters.pop(key, None)))
+        else:
+            self.stats["coalesced"] += 1
+            self.stats["waiters"] += 1
+            n = self._waiters[key] = self._waiters.get(key, 0) + 1
+            self.stats["max_waiters"] = max(self.stats["max_waiters"], n)
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> dict:
+        """Clé → nombre d'appelants en attente derrière l'exécution en cours."""
+        return dict(self._waiters)
+
+def coalescing_ratio() -> float:
+    return FLIGHT_STATS["coalesced"] / FLIGHT_STATS["calls"] if FLIGHT_STATS["calls"] else 0.0
+
+_FLIGHTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, SingleFlight]" = weakref.WeakKeyDictionary()
+
+async def fetch_url_async(url: str, cache: bool = True) -> str:
+    """Fetch HTTP dédupliqué : un seul téléchargement par URL normalisée à la fois.
+    cache=False : pages figées (saisons passées) qu'il est inutile de garder dans le cache HTTP."""
+    key = normalize_url(url)
+    return await _loop_local(_FLIGHTS, SingleFlight).do(key, lambda: _fetch_cached(url, key) if cache else _fetch_direct(url))
+
+async def _fetch_direct(url: str) -> str:
+    status, _, body = await get_fetcher().get(url)
+    if status != 200: raise FetchError(status, url)
+    if RECORDER: await asyncio.to_thread(RECORDER.put, url, body)
+    return body
+
+async def fetch_parsed(url: str, name: str, parse, cache: bool = True):
+    """fetch_url_async + parse(html), le résultat parsé étant lui aussi partagé
+    entre appelants simultanés (name distingue les parseurs d'une même page)."""
+    async def run():
+        h = await fetch_url_async(url, cache)
+        parser = name.split(":")[0]
+        with METRICS.span("parse", parser=parser):
+            out = await asyncio.to_thread(parse, h)   # page nationale : ~0,1 s de CPU, hors de la boucle
+        METRICS.inc("natation_rows_parsed_total", len(out), parser=parser)
+        return out
+    return await _loop_local(_FLIGHTS, SingleFlight).do(f"{normalize_url(url)}#{name}", run)
+
+async def _fetch_cached(url: str, key: str) -> str:
+    """Fetch HTTP via le cache partagé : frais → disque, périmé → revalidation ETag/Last-Modified.
+    Lectures, écritures SQLite et (dé)compression zlib se font hors de la boucle."""
+    entry = await asyncio.to_thread(CACHE.get, key)
+    if entry and time.time() - entry.fetched_at < cache_ttl(key):
+        CACHE.stats["hits"] += 1
+        return entry.body
+    CACHE.stats["misses"] += 1
+    cond = {}
+    if entry and entry.etag:          cond["If-None-Match"] = entry.etag
+    if entry and entry.last_modified: cond["If-Modified-Since"] = entry.last_modified
+    try:
+        status, headers, body = await get_fetcher().get(url, cond)
+        # Seul un 200 est une page : 3xx non résolu, 204… ne doivent ni être mis
+        # en cache ni parsés comme une page vide
+        if status != 200 and not (status == 304 and entry): raise FetchError(status, url)
+    except Exception:
+        if not entry: raise
+        CACHE.stats["stale_served"] += 1
+        return entry.body
+    if status == 304 and entry:
+        CACHE.stats["revalidated"] += 1
+        await asyncio.to_thread(CACHE.touch, key)
+        return entry.body
+    await asyncio.to_thread(CACHE.put, key, body, headers.get("etag", ""), headers.get("last-modified", ""))
+    if RECORDER: await asyncio.to_thread(RECORDER.put, url, body)
+    return body
+
+async def fetch_ranking_table(bc: str, idepr: int, sai: int, cache: bool = True) -> RankingTable:
+    """Classement national complet, parsé une fois ; les catégories du roster
+    partagent la même page (single-flight + cache HTTP)."""
+    return await fetch_parsed(ranking_table_url(bc, idepr, sai), "table", roster_ranking_table, cache=cache)
+
+async def ranking_tops(table: RankingTable, bc: str, idepr: int, sai: int, cat: int, cache: bool = True,
+                       known: Optional[dict] = None) -> dict:
+    """Les 6 top 10 d'une catégorie : dérivés de la page nationale quand ses lignes
+    le permettent, sinon lus sur les pages idcat/iddep/idreg correspondantes. Un
+    périmètre dont la page a échoué est absent (rien n'est marqué « vu »).
+    known : tops déjà obtenus pour une autre catégorie (les « _tc » ne dépendent pas d'elle)."""
+    tops = {**(known or {}), **table.tops(sai, cat, swimmer_ids=[s.id for s in ROSTER])}
+    missing = [scope for scope in NO_RANKS if scope not in tops]
+    pages = await asyncio.gather(*(fetch_parsed(ranking_url(bc, idepr, sai, cat, scope), "top10", roster_top10, cache)
+                                   for scope in missing), return_exceptions=True)
+    for scope, top in zip(missing, pages):
+        if isinstance(top, Exception):
+            METRICS.inc("natation_errors_total", where="ranking_tops", kind=type(top).__name__)
+        else:
+            tops[scope] = top
+    return tops
+
+RANK_FALLBACK_SCOPES = ("dept", "region", "national")   # pages par catégorie, de la plus courte à la plus longue
+
+async def roster_ranks(table: RankingTable, bc: str, idepr: int, sai: int, cat: int, ids, cache: bool = True) -> dict:
+    """Rangs des nageurs ids : dérivés de la page nationale, ou lus dans le tippy de
+    leur ligne. Un nageur absent de la page nationale (classement tronqué…) est
+    cherché sur les pages de sa catégorie, périmètre par périmètre ; elles sont
+    partagées avec ranking_tops (single-flight + cache). Introuvable : absent du
+    résultat, les rangs déjà stockés restent en place."""
+    ranks = {sid: table.ranks(sid, sai, cat) for sid in ids}
+    missing = [sid for sid, r in ranks.items() if r == NO_RANKS]
+    for scope in RANK_FALLBACK_SCOPES:
+        if not missing: break
+        try:
+            found = await fetch_parsed(ranking_url(bc, idepr, sai, cat, scope), "ranks:" + ",".join(missing),
+                                       functools.partial(parse_rankings, swimmer_ids=missing), cache)
+        except Exception as e:
+            METRICS.inc("natation_errors_total", where="roster_ranks", kind=type(e).__name__)
+            continue
+        ranks.update({sid: r for sid, r in found.items() if r != NO_RANKS})
+        missing = [sid for sid in missing if ranks[sid] == NO_RANKS]
+    return {sid: r for sid, r in ranks.items() if r != NO_RANKS}
+
+async def _fetch_one(args: tuple) -> tuple:
+    """Une page nationale par (épreuve, bassin) : rangs des nageurs du roster de
+    cette catégorie et les 6 top 10, tous dérivés localement."""
+    bc, bl, epr_name, idepr, sai, cat, ids = args
+    try:
+        with METRICS.span("handler", handler="fetch_one"):
+            table = await fetch_ranking_table(bc, idepr, sai)
+            ranks, tops = await asyncio.gather(roster_ranks(table, bc, idepr, sai, cat, ids),
+                                               ranking_tops(table, bc, idepr, sai, cat))
+        return (bl, epr_name, cat, ranks, tops)
+    except Exception as e:
+        METRICS.inc("natation_errors_total", where="fetch_one", kind=type(e).__name__)
+        print(f"[fetch_one] {epr_name} {bl} U{cat}: {type(e).__name__}: {e}")
+        return (bl, epr_name, cat, {}, {})   # rien d'écrit : les rangs stockés restent
+
+# Paires (épreuve, bassin) sans nouvelle perf : classement rafraîchi au plus une fois par jour
+RANKINGS_MAX_AGE = 24 * 3600
+
+def _pair_signature(results: list) -> dict:
+    sig: dict[tuple, list] = {}
+    for r in results:
+        sig.setdefault((r["E"].rstrip("."), r["B"]), []).append((r["D"], r["T"], r["P"], r["N"]))
+    return {k: sorted(v) for k, v in sig.items()}
+
+def changed_pairs(old: list, new: list) -> set:
+    """(épreuve, bassin) dont les performances ont été ajoutées, modifiées ou retirées."""
+    a, b = _pair_signature(old), _pair_signature(new)
+    return {k for k in a.keys() | b.keys() if a.get(k) != b.get(k)}
+
+def ranking_page_key(sai: int, epr_name: str, bl: str, cat: int) -> str:
+    return f"{sai}|{epr_name}|{bl}|U{cat}"
+
+def roster_ranking_tasks(sai: int) -> list:
+    """Une tâche par (bassin, épreuve, catégorie) : les nageurs de même catégorie
+    partagent les mêmes rangs/top 10, et toutes les catégories la même page nationale."""
+    by_cat: dict[int, list[str]] = {}
+    for s in ROSTER: by_cat.setdefault(sai - s.birth_year, []).append(s.id)
+    return [
+        (bc, bl, epr_name, idepr, sai, cat, ids)
+        for cat, ids in sorted(by_cat.items())
+        for bc, bl in [("25", "25m"), ("50", "50m")]
+        for epr_name, idepr in EPREUVE_CODES.items()
+    ]
+
+# ── Stockage serveur (SQLite) ────────────────────────────────────────────────
+
+# Splits d'une course : 14 octets par passage, temps en centièmes (-1 = absent)
+@functools.cache
+def split_dtype() -> np.dtype:
+    return np.dtype([("dist", "<u2"), ("cumul", "<i4"), ("lap", "<i4"), ("half", "<i4")])
+
+def _cs_or_none(t: Optional[str]) -> int:
+    cs = parse_time_cs(t) if t else None
+    return -1 if cs is None else cs
+
+def pack_splits(splits: list[Split]) -> bytes:
+    return np.array([(s.distance_m, _cs_or_none(s.cumulative_time), _cs_or_none(s.lap_time), _cs_or_none(s.half_time))
+                     for s in splits], dtype=split_dtype()).tobytes()
+
+def unpack_splits(blob: bytes) -> np.ndarray:
+    return np.frombuffer(blob, dtype=split_dtype())
+
+def perf_uid(swimmer_id: str, epreuve: str, bassin: str, date: str, temps: str, competition: str, n: int = 0) -> str:
+    """Identifiant stable d'une performance d'un refresh à l'autre (n = rang parmi les doublons exacts)."""
+    raw = "|".join((swimmer_id, epreuve, bassin, date, temps, competition, str(n)))
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=8).hexdigest()
+
+DB_PATH = os.environ.get("NATATION_DB", "natation.db")
+SCHEMA_VERSION = 1   # PRAGMA user_version : les changements de schéma futurs migreront à partir d'ici
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS performances (
+    id INTEGER PRIMARY KEY,
+    swimmer_id TEXT NOT NULL, epreuve TEXT NOT NULL, bassin TEXT NOT NULL, saison INTEGER,
+    date TEXT, temps TEXT, points TEXT, competition TEXT, type_compet TEXT,
+    temps_cs INTEGER, date_ord INTEGER,           -- NULL = valeur FFN illisible
+    uid TEXT                                      -- identifiant stable (perf_uid)
+);
+CREATE INDEX IF NOT EXISTS perf_idx ON performances(swimmer_id, epreuve, bassin, saison);
+CREATE INDEX IF NOT EXISTS perf_uid ON performances(uid);
+CREATE TABLE IF NOT EXISTS perf_splits (
+    uid TEXT PRIMARY KEY, n INTEGER, data BLOB     -- tableau split_dtype() sérialisé
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rankings (
+    swimmer_id TEXT NOT NULL, epreuve TEXT NOT NULL, bassin TEXT NOT NULL, saison INTEGER NOT NULL,
+    scope TEXT NOT NULL, rang TEXT,
+    PRIMARY KEY (swimmer_id, epreuve, bassin, saison, scope)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS top10 (
+    epreuve TEXT NOT NULL, bassin TEXT NOT NULL, saison INTEGER NOT NULL, categorie INTEGER NOT NULL,
+    scope TEXT NOT NULL, pos INTEGER NOT NULL, rang TEXT, nom TEXT, temps TEXT, swimmer_id TEXT,
+    PRIMARY KEY (epreuve, bassin, saison, categorie, scope, pos)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS top10_swimmer ON top10(swimmer_id);
+CREATE TABLE IF NOT EXISTS ranking_pages (page_key TEXT PRIMARY KEY, saison INTEGER, fetched_at REAL);
+-- Reprise de l'historique : une ligne par page tentée, une par saison terminée (figée)
+CREATE TABLE IF NOT EXISTS backfill_pages (
+    page_key TEXT PRIMARY KEY, saison INTEGER NOT NULL, status TEXT NOT NULL,   -- done | empty (confirmé) | error
+    attempts INTEGER NOT NULL DEFAULT 0, updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS backfill_seasons (saison INTEGER PRIMARY KEY, pages INTEGER, completed_at REAL);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+# Domaines versionnés séparément : un top 10 écrit n'invalide pas les modèles de résultats
+VERSION_DOMAINS = ("results", "rankings")
+
+class Store:
+    """Données partagées par toutes les sessions. Les sessions ne gardent que des
+    clés (nageur, nage, bassin) et les versions des données ; une écriture qui
+    modifie des lignes incrémente la version de son domaine (une seule fois par
+    lot, voir batch) pour invalider les vars calculées qui en dépendent."""
+
+    def __init__(self, path: str = DB_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._batch = threading.local()   # lot propre au thread qui l'ouvre (depth, pending)
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(_SCHEMA)
+            self._db.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        return self._db
+
+    def _query(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._conn().execute(sql, params).fetchall()
+
+    def _write(self, fn, domain: str = ""):
+        """Exécute fn(db) dans une transaction ; si des lignes ont changé, incrémente
+        la version du domaine (ou la diffère à la fin du lot en cours)."""
+        with self._lock:
+            db = self._conn()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                before = db.total_changes
+                fn(db)
+                if domain and db.total_changes != before:
+                    if getattr(self._batch, "depth", 0): self._batch.pending.add(domain)
+                    else: self._bump(db, (domain,))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _bump(db, domains):
+        for key in ("version", *(f"version:{d}" for d in domains)):
+            db.execute("INSERT INTO meta VALUES (?, '1') "
+                       "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1", (key,))
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Écritures groupées (une phase de rafraîchissement) : une seule
+        incrémentation par domaine touché, à la sortie du lot le plus externe. Le
+        lot ne diffère que les écritures de son thread, et ne doit pas englober
+        d'await : les autres écrivains (préchargement, snapshot) publient aussitôt."""
+        b = self._batch
+        if not getattr(b, "depth", 0): b.depth, b.pending = 0, set()
+        b.depth += 1
+        try:
+            yield
+        finally:
+            b.depth -= 1
+            pending = [] if b.depth else sorted(b.pending)
+            if pending: self._write(lambda db: self._bump(db, pending))
+
+    def _meta(self, key: str, default: str = "") -> str:
+        rows = self._query("SELECT value FROM meta WHERE key=?", (key,))
+        return rows[0][0] if rows else default
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Verrou inter-process expirant (meta « name » = owner|échéance)."""
+        with self._lock:
+            db = self._conn()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute("SELECT value FROM meta WHERE key=?", (name,)).fetchone()
+                now = time.time()
+                if row:
+                    holder, _, expires = row[0].partition("|")
+                    if holder != owner and float(expires or 0) > now:
+                        db.execute("COMMIT")
+                        return False
+                db.execute("INSERT OR REPLACE INTO meta VALUES (?,?)", (name, f"{owner}|{now + ttl}"))
+                db.execute("COMMIT")
+                return True
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def version(self, domain: str = "") -> int:
+        """Version d'un domaine de VERSION_DOMAINS ; "" = toute écriture confondue."""
+        return int(self._meta(f"version:{domain}" if domain else "version", "0"))
+
+    def versions(self) -> dict:
+        rows = dict(self._query("SELECT key, value FROM meta WHERE key LIKE 'version:%'"))
+        return {d: int(rows.get(f"version:{d}", 0)) for d in VERSION_DOMAINS}
+
+    def last_update(self) -> float:
+        return float(self._meta("last_update", "0"))
+
+    # ── Performances ──
+
+    def replace_results(self, swimmer_id: str, perfs: list):
+        """perfs : [(bassin, Performance)] — remplace toutes les perfs du nageur.
+        Les splits sont rangés à part, par identifiant stable."""
+        seen: dict[tuple, int] = {}
+        rows, splits = [], []
+        for bl, p in perfs:
+            ident = (p.epreuve, bl, p.date, p.temps_final, p.competition)
+            seen[ident] = seen.get(ident, -1) + 1
+            uid = perf_uid(swimmer_id, *ident, seen[ident])
+            rows.append((swimmer_id, p.epreuve, bl, datetime.fromordinal(p.date_ord).year if p.date_ord else None,
+                         p.date, p.temps_final, p.points, p.competition, p.type_compet, p.temps_cs, p.date_ord, uid))
+            if p.splits: splits.append((uid, len(p.splits), pack_splits(p.splits)))
+        def fn(db):
+            cur = db.execute("SELECT swimmer_id, epreuve, bassin, saison, date, temps, points, competition, type_compet, "
+                             "temps_cs, date_ord, uid FROM performances WHERE swimmer_id=? ORDER BY id", (swimmer_id,)).fetchall()
+            if cur == rows and {u: (n, b) for u, n, b in db.execute(
+                    "SELECT s.uid, s.n, s.data FROM perf_splits s JOIN performances p ON p.uid = s.uid "
+                    "WHERE p.swimmer_id=?", (swimmer_id,))} == {u: (n, b) for u, n, b in splits}:
+                return   # rien de neuf : ni écriture ni nouvelle version
+            gone = {r[-1] for r in cur} - {r[-1] for r in rows}
+            db.executemany("DELETE FROM perf_splits WHERE uid=?", [(u,) for u in gone])
+            db.execute("DELETE FROM performances WHERE swimmer_id=?", (swimmer_id,))
+            db.executemany(
+                "INSERT INTO performances (swimmer_id, epreuve, bassin, saison, date, temps, points, competition, type_compet, temps_cs, date_ord, uid) "
+                "VALUES (?,?,?,?,?,?,?,?,?,?,?,?)", rows)
+            db.executemany("INSERT OR REPLACE INTO perf_splits VALUES (?,?,?)", splits)
+        self._write(fn, "results")
+        self._write(lambda db: db.execute("INSERT OR REPLACE INTO meta VALUES ('last_update', ?)", (str(time.time()),)))
+
+    def results(self, swimmer_id: str) -> list[dict]:
+        rows = self._query(
+            "SELECT epreuve, temps, points, date, bassin, competition, type_compet, temps_cs, date_ord, uid "
+            "FROM performances WHERE swimmer_id=? ORDER BY id", (swimmer_id,))
+        return [{"E": e, "T": t, "P": pts, "D": d, "B": b, "N": n, "V": v, "cs": cs, "do": do, "id": uid or ""}
+                for e, t, pts, d, b, n, v, cs, do, uid in rows]
+
+    def splits(self, uid: str) -> np.ndarray:
+        rows = self._query("SELECT data FROM perf_splits WHERE uid=?", (uid,))
+        return unpack_splits(rows[0][0]) if rows else np.empty(0, dtype=split_dtype())
+
+    def swimmer_splits(self, swimmer_id: str) -> list[tuple]:
+        """[(uid, nb de passages, blob)] de toutes les courses du nageur ayant des splits."""
+        return self._query(
+            "SELECT s.uid, s.n, s.data FROM perf_splits s JOIN performances p ON p.uid = s.uid "
+            "WHERE p.swimmer_id=? AND s.n > 0 GROUP BY s.uid", (swimmer_id,))
+
+    # ── Classements ──
+
+    @staticmethod
+    def _put_rankings(db, saison: int, epreuve: str, bassin: str, ranks_by_swimmer: dict):
+        # « - » = rang non lu (page en échec, nageur introuvable) : ne remplace pas un rang connu
+        db.executemany("INSERT OR REPLACE INTO rankings VALUES (?,?,?,?,?,?)",
+                       [(sid, epreuve, bassin, saison, scope, rang)
+                        for sid, ranks in ranks_by_swimmer.items() for scope, rang in ranks.items() if rang != "-"])
+
+    def put_rankings(self, saison: int, epreuve: str, bassin: str, ranks_by_swimmer: dict):
+        self._write(lambda db: self._put_rankings(db, saison, epreuve, bassin, ranks_by_swimmer), "rankings")
+
+    def rankings(self, swimmer_id: str, saison: int) -> dict:
+        """{"épreuve|bassin": {scope: rang}}"""
+        out: dict[str, dict] = {}
+        for e, b, scope, rang in self._query(
+                "SELECT epreuve, bassin, scope, rang FROM rankings WHERE swimmer_id=? AND saison=?", (swimmer_id, saison)):
+            out.setdefault(f"{e}|{b}", {})[scope] = rang
+        return out
+
+    def ranking_rows(self, swimmer_id: str) -> list[tuple]:
+        """(saison, épreuve, bassin, portée, rang) sur toutes les saisons."""
+        return self._query("SELECT saison, epreuve, bassin, scope, rang FROM rankings WHERE swimmer_id=? "
+                           "ORDER BY saison, epreuve, bassin, scope", (swimmer_id,))
+
+    def top10_rows(self, **where) -> list[tuple]:
+        """Lignes de top 10 stockées, filtrées par colonnes (saison, epreuve, bassin, categorie, scope)."""
+        where = {k: v for k, v in where.items() if k in ("saison", "epreuve", "bassin", "categorie", "scope")}
+        sql = " AND ".join([f"{k}=?" for k in where] + ["pos >= 0"])
+        return self._query("SELECT saison, epreuve, bassin, categorie, scope, pos, rang, nom, temps, swimmer_id "
+                           f"FROM top10 WHERE {sql} ORDER BY saison, epreuve, bassin, categorie, scope, pos",
+                           tuple(where.values()))
+
+    @staticmethod
+    def _put_top10(db, saison: int, epreuve: str, bassin: str, scope: str, cat: int, entries: list):
+        cat = 0 if scope.endswith("_tc") else cat
+        db.execute("DELETE FROM top10 WHERE epreuve=? AND bassin=? AND saison=? AND categorie=? AND scope=?",
+                   (epreuve, bassin, saison, cat, scope))
+        db.executemany("INSERT INTO top10 VALUES (?,?,?,?,?,?,?,?,?,?)",
+                       [(epreuve, bassin, saison, cat, scope, i, e["rang"], e["nom"], e["temps"], e.get("id", ""))
+                        for i, e in enumerate(entries)])
+        db.execute("INSERT OR REPLACE INTO top10 VALUES (?,?,?,?,?,?,?,?,?,?)",
+                   (epreuve, bassin, saison, cat, scope, -1, "", "", "", ""))   # marqueur « page vue »
+
+    def put_top10(self, saison: int, epreuve: str, bassin: str, scope: str, cat: int, entries: list):
+        self._write(lambda db: self._put_top10(db, saison, epreuve, bassin, scope, cat, entries), "rankings")
+
+    def put_ranking_table(self, saison: int, epreuve: str, bassin: str, cat: int, ranks: dict, tops: dict):
+        """Rangs et top 10 dérivés d'une même page nationale, en une transaction."""
+        def fn(db):
+            if ranks: self._put_rankings(db, saison, epreuve, bassin, ranks)
+            for scope, entries in tops.items(): self._put_top10(db, saison, epreuve, bassin, scope, cat, entries)
+        self._write(fn, "rankings")
+
+    def top10(self, saison: int, epreuve: str, bassin: str, scope: str, cat: int) -> Optional[list]:
+        """None si la page n'a jamais été récupérée, [] si elle était vide."""
+        cat = 0 if scope.endswith("_tc") else cat
+        rows = self._query("SELECT pos, rang, nom, temps, swimmer_id FROM top10 "
+                           "WHERE epreuve=? AND bassin=? AND saison=? AND categorie=? AND scope=? ORDER BY pos",
+                           (epreuve, bassin, saison, cat, scope))
+        if not rows: return None
+        return [{"rang": r, "nom": n, "temps": t, "id": sid} for pos, r, n, t, sid in rows if pos >= 0]
+
+    def pages_fetched(self, saison: int) -> dict:
+        return dict(self._query("SELECT page_key, fetched_at FROM ranking_pages WHERE saison=?", (saison,)))
+
+    def mark_pages_fetched(self, saison: int, keys: list, at: float):
+        def fn(db):
+            db.executemany("INSERT OR REPLACE INTO ranking_pages VALUES (?,?,?)", [(k, saison, at) for k in keys])
+        self._write(fn)
+
+    def rank_history(self, swimmer_id: str, epreuve: str, bassin: str) -> dict:
+        """{saison: {scope: rang}} sur toutes les saisons connues."""
+        out: dict[int, dict] = {}
+        for sai, scope, rang in self._query(
+                "SELECT saison, scope, rang FROM rankings WHERE swimmer_id=? AND epreuve=? AND bassin=? ORDER BY saison",
+                (swimmer_id, epreuve, bassin)):
+            out.setdefault(sai, {})[scope] = rang
+        return out
+
+    # ── Reprise de l'historique ──
+
+    def first_season(self) -> Optional[int]:
+        rows = self._query("SELECT MIN(saison) FROM performances")
+        return rows[0][0] if rows else None
+
+    def completed_seasons(self) -> set:
+        return {r[0] for r in self._query("SELECT saison FROM backfill_seasons")}
+
+    def backfill_state(self, saison: int) -> dict:
+        """page_key → (status, attempts) des pages déjà tentées pour la saison."""
+        return {k: (st, n) for k, st, n in self._query(
+            "SELECT page_key, status, attempts FROM backfill_pages WHERE saison=?", (saison,))}
+
+    def put_backfill(self, saison: int, results: list):
+        """Un lot de pages en une transaction : données + point de reprise.
+        results : [(page_key, status, epreuve, bassin, {cat: (ranks, tops)})]"""
+        now = time.time()
+        def fn(db):
+            for key, status, epr, bl, by_cat in results:
+                for cat, (ranks, tops) in by_cat.items():
+                    if ranks: self._put_rankings(db, saison, epr, bl, ranks)
+                    for scope, top in tops.items(): self._put_top10(db, saison, epr, bl, scope, cat, top)
+                db.execute("INSERT INTO backfill_pages VALUES (?,?,?,1,?) ON CONFLICT(page_key) DO UPDATE SET "
+                           "status=excluded.status, attempts=attempts+1, updated_at=excluded.updated_at",
+                           (key, saison, status, now))
+        self._write(fn, "rankings")
+
+    def complete_season(self, saison: int, pages: int):
+        self._write(lambda db: db.execute("INSERT OR REPLACE INTO backfill_seasons VALUES (?,?,?)",
+                                          (saison, pages, time.time())))
+
+STORE = Store()
+
+# ── Modèle colonnes des résultats ────────────────────────────────────────────
+
+POOLS   = ("25m", "50m")
+STROKES = ("NL", "Bra", "Dos", "Pap", "4 N")
+_NO_TIME = 2**31 - 1   # int32 max : « pas de temps »
+
+def stroke_of(nage: str) -> str:
+    n = nage.upper()
+    return "NL" if "NL" in n or "LIBRE" in n else "Bra" if "BRA" in n else "Dos" if "DOS" in n else "Pap" if "PAP" in n else "4 N" if "4 N" in n else ""
+
+# Colonnes « épreuve » des tableaux numpy : même ordre que EPREUVE_CODES
+EVENT_NAMES = tuple(EPREUVE_CODES)
+EVENT_INDEX = {e: i for i, e in enumerate(EVENT_NAMES)}
+
+def event_key(nage: str) -> str:
+    """« 100 Nage Libre », « 100 NL. »… → clé d'EPREUVE_CODES (« 100 NL »)."""
+    m = _DIGITS_RE.search(nage)
+    return f"{m.group() if m else ''} {stroke_of(nage)}".strip()
+
+class ResultsModel:
+    """Résultats d'un nageur en colonnes NumPy, construits une fois par version
+    du jeu de données, avec un index (épreuve, bassin) → lignes triées par date décroissante."""
+    __slots__ = ("rows", "time_cs", "date_ord", "dist", "stroke", "pool", "event", "by_event", "events_by_pool")
+
+    def __init__(self, results: list[dict]):
+        self.rows     = [Result(**r) for r in results]
+        self.time_cs  = np.array([_NO_TIME if r["cs"] is None else r["cs"] for r in results], dtype=np.int32)
+        self.date_ord = np.array([r["do"] or 0 for r in results], dtype=np.int32)
+        self.dist     = np.array([int(m.group()) if (m := _DIGITS_RE.search(r["E"])) else 0 for r in results], dtype=np.int16)
+        self.stroke   = np.array([STROKES.index(st) if (st := stroke_of(r["E"])) else -1 for r in results], dtype=np.int8)
+        self.pool     = np.array([POOLS.index(r["B"]) if r["B"] in POOLS else -1 for r in results], dtype=np.int8)
+        self.event    = np.array([EVENT_INDEX.get(event_key(r["E"]), -1) for r in results], dtype=np.int8)
+        groups: dict[tuple, list[int]] = {}
+        for i, r in enumerate(results): groups.setdefault((r["E"], r["B"]), []).append(i)
+        self.by_event = {}
+        for key, idx in groups.items():
+            idx = np.array(idx, dtype=np.int32)
+            self.by_event[key] = idx[np.argsort(-self.date_ord[idx], kind="stable")]
+        self.events_by_pool: dict[str, list[str]] = {}
+        for e, b in sorted(groups, key=lambda k: self.dist[groups[k][0]]):
+            self.events_by_pool.setdefault(b, []).append(e)
+
+    def events(self, bassin: str, stroke: str = "") -> list[str]:
+        ev = self.events_by_pool.get(bassin, [])
+        return [e for e in ev if stroke_of(e) == stroke] if stroke else ev
+
+    def results(self, epreuve: str, bassin: str) -> list[Result]:
+        return [self.rows[i] for i in self.by_event.get((epreuve, bassin), ())]
+
+    def chronological(self, epreuve: str, bassin: str) -> np.ndarray:
+        """Lignes valides (temps et date lisibles) dans l'ordre chronologique."""
+        idx = self.by_event.get((epreuve, bassin), np.empty(0, dtype=np.int32))[::-1]
+        return idx[(self.time_cs[idx] != _NO_TIME) & (self.date_ord[idx] > 0)]
+
+    def best(self, epreuve: str, bassin: str) -> Optional[Result]:
+        idx = self.by_event.get((epreuve, bassin))
+        if idx is None or not len(idx): return None
+        i = idx[np.argmin(self.time_cs[idx])]
+        return self.rows[i] if self.time_cs[i] != _NO_TIME else None
+
+    def best_by_event(self, bassin: str) -> np.ndarray:
+        """Meilleur temps (cs) par colonne d'EVENT_NAMES dans ce bassin, _NO_TIME si jamais nagée."""
+        out = np.full(len(EVENT_NAMES), _NO_TIME, dtype=np.int32)
+        m = (self.pool == POOLS.index(bassin)) & (self.event >= 0)
+        np.minimum.at(out, self.event[m], self.time_cs[m])
+        return out
+
+@functools.lru_cache(maxsize=32)
+def results_model(swimmer_id: str, version: int) -> ResultsModel:
+    return ResultsModel(STORE.results(swimmer_id))
+
+RESULTS_PAGE_SIZE = 20
+
+@functools.lru_cache(maxsize=64)
+def result_rows(swimmer_id: str, version: int, epreuve: str, bassin: str) -> list[ResultRow]:
+    """Lignes du tableau (plus récentes d'abord), record marqué côté serveur."""
+    m = results_model(swimmer_id, version)
+    best = m.best(epreuve, bassin)
+    return [ResultRow(id=r.id, D=r.D, T=r.T, P=r.P, N=r.N, V=r.V, pb=best is not None and r.T == best.T)
+            for r in m.results(epreuve, bassin)]
+
+# ── Grilles de qualification (compilées en tableaux âge × épreuve) ──────────
+
+class QualifGrid:
+    """Temps limites en centièmes : lignes = âges de catégorie (U14 → 14), colonnes
+    = EVENT_NAMES, 0 = pas de temps limite. Texte d'origine conservé pour l'affichage."""
+    __slots__ = ("name", "label", "bassin", "saison", "ages", "cs", "txt")
+
+    def __init__(self, name: str, label: str, bassin: str, saison: Optional[int], grille: dict):
+        self.name, self.label, self.bassin, self.saison = name, label, bassin, saison
+        self.ages = np.array(sorted(int(c.lstrip("U")) for c in grille), dtype=np.int16)
+        self.cs  = np.zeros((len(self.ages), len(EVENT_NAMES)), dtype=np.int32)
+        self.txt = np.full(self.cs.shape, "", dtype=object)
+        for cat, times in grille.items():
+            r = int(np.searchsorted(self.ages, int(cat.lstrip("U"))))
+            for e, t in times.items():
+                j, cs = EVENT_INDEX.get(event_key(e)), parse_time_cs(t)
+                if j is None or not cs: continue
+                self.cs[r, j], self.txt[r, j] = cs, t
+
+    def applies(self, bassin: str, saison: int) -> bool:
+        return self.bassin == bassin and self.saison in (None, saison)
+
+    def targets(self, cats: np.ndarray) -> np.ndarray:
+        """(nageurs, épreuves) : ligne de la grille pour chaque catégorie, 0 hors grille."""
+        r = np.searchsorted(self.ages, cats).clip(0, max(len(self.ages) - 1, 0))
+        hit = self.ages[r] == cats if len(self.ages) else np.zeros(len(cats), dtype=bool)
+        return np.where(hit[:, None], self.cs[r], 0)
+
+    def time(self, cat: int, nage: str) -> tuple:
+        """(cs, texte) du temps limite, (0, "") si absent."""
+        j, r = EVENT_INDEX.get(event_key(nage)), int(np.searchsorted(self.ages, cat))
+        if j is None or r >= len(self.ages) or self.ages[r] != cat: return 0, ""
+        return int(self.cs[r, j]), self.txt[r, j]
+
+def load_qualif_grids() -> list[QualifGrid]:
+    grids = dict(QUALIF_GRIDS)
+    if os.path.exists(QUALIF_GRIDS_PATH):
+        with open(QUALIF_GRIDS_PATH, encoding="utf-8") as f:
+            for name, g in json.load(f).items():
+                grids[name] = (g.get("label", name), g.get("bassin", "50m"), g.get("saison"), g["grille"])
+    return [QualifGrid(name, *g) for name, g in grids.items()]
+
+@functools.cache
+def qualif_engine() -> list[QualifGrid]:
+    return load_qualif_grids()
+
+def qualif_grid(bassin: str, saison: int) -> Optional[QualifGrid]:
+    """Grille de référence pour l'écran d'une nage : celle de la saison d'abord, puis permanente."""
+    grids = [g for g in qualif_engine() if g.applies(bassin, saison)]
+    return min(grids, key=lambda g: g.saison is None, default=None)
+
+def qualif_gap_txt(best_cs: int, q_cs: int, category: str) -> str:
+    if not q_cs or not best_cs: return ""
+    diff = (best_cs - q_cs) / 100
+    return "Qualifié ! 🎉" if diff <= 0 else f"+{diff:.2f}s (Cible {category})"
+
+@functools.lru_cache(maxsize=8)
+def qualif_overview(version: int, saison: int) -> tuple:
+    """Écarts de tout le roster à toutes les grilles, un calcul (nageurs × épreuves)
+    par grille. → (pcts croissants, [QualifRow] dans le même ordre)."""
+    cats = np.array([saison - s.birth_year for s in ROSTER], dtype=np.int16)
+    pcts, rows = [], []
+    for grid in qualif_engine():
+        if grid.saison not in (None, saison): continue
+        best = np.stack([results_model(s.id, version).best_by_event(grid.bassin) for s in ROSTER])
+        target = grid.targets(cats)
+        ok = (target > 0) & (best != _NO_TIME)
+        gap = best.astype(np.int64) - target
+        pct = np.divide(100.0 * gap, target, out=np.zeros(gap.shape), where=ok)
+        for i, j in zip(*np.nonzero(ok)):
+            pcts.append(pct[i, j])
+            rows.append(QualifRow(
+                nom=ROSTER[i].nom, epreuve=EVENT_NAMES[j], grille=f"{grid.label} U{cats[i]}",
+                meilleur=format_cs(int(best[i, j])), cible=format_cs(int(target[i, j])),
+                ecart=format_gap(gap[i, j]), pct=f"{pct[i, j]:+.1f} %", ok=bool(gap[i, j] <= 0)))
+    order = np.argsort(pcts, kind="stable")
+    return np.array(pcts)[order], [rows[k] for k in order]
+
+# ── Analyse d'allure : splits en matrices (courses × passages) ──────────────
+
+class EventPacing:
+    """Splits de toutes les courses d'une épreuve (épreuve, bassin) : une ligne par
+    course (ordre chronologique), une colonne par passage, centièmes en float (NaN =
+    absent). Indicateurs calculés d'un bloc pour toutes les courses."""
+    __slots__ = ("uids", "dist", "total", "cumul", "laps", "profile", "fade", "half_diff",
+                 "ideal_laps", "ideal", "pb", "lap_vs_pb", "cumul_vs_pb", "_row")
+
+    def __init__(self, uids: list, dist: np.ndarray, cumul: np.ndarray, lap: np.ndarray, total: np.ndarray):
+        self.uids, self.dist, self.total, self.cumul = uids, dist, total, cumul
+        self._row = {u: i for i, u in enumerate(uids)}
+        # Partiels : différence des cumuls quand les deux bornes sont connues, sinon partiel FFN
+        prev = np.hstack([np.zeros((len(uids), 1)), cumul[:, :-1]])
+        self.laps = np.where(np.isnan(cumul) | np.isnan(prev), lap, cumul - prev)
+        with np.errstate(invalid="ignore", divide="ignore"), warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)   # lignes entièrement NaN
+            mean = np.nanmean(self.laps, axis=1, keepdims=True)
+            # Profil : chaque partiel rapporté au partiel moyen de la course (1.0 = allure moyenne)
+            self.profile = self.laps / mean
+            # Fade : dernier partiel vs moyenne des partiels intermédiaires (hors départ plongé), en %
+            n = self.laps.shape[1]
+            self.fade = (100 * (self.laps[:, -1] / np.nanmean(self.laps[:, 1:-1], axis=1) - 1)
+                         if n >= 3 else np.full(len(uids), np.nan))
+            # 2e moitié − 1re moitié (centièmes) à partir du cumul à mi-course
+            half = np.flatnonzero(dist == dist[-1] // 2)
+            fin = np.where(np.isnan(cumul[:, -1]), total, cumul[:, -1])
+            self.half_diff = (fin - 2 * cumul[:, half[0]]) if len(half) else np.full(len(uids), np.nan)
+            # Course idéale : meilleur partiel à chaque passage, toutes courses confondues
+            self.ideal_laps = np.nanmin(self.laps, axis=0) if len(uids) else np.empty(0)
+            self.ideal = float(self.ideal_laps.sum()) if len(uids) and not np.isnan(self.ideal_laps).any() else None
+        # Référence : meilleur temps final parmi les courses aux splits complets
+        complete = ~np.isnan(self.laps).any(axis=1)
+        self.pb = int(np.flatnonzero(complete)[np.argmin(total[complete])]) if complete.any() else None
+        if self.pb is None:
+            self.lap_vs_pb = self.cumul_vs_pb = np.full_like(self.laps, np.nan)
+        else:
+            self.lap_vs_pb = self.laps - self.laps[self.pb]
+            self.cumul_vs_pb = cumul - cumul[self.pb]
+
+    def row(self, uid: str) -> Optional[int]:
+        return self._row.get(uid)
+
+class PacingModel:
+    """Toutes les courses à splits d'un nageur, chargées en un bloc puis ventilées par épreuve."""
+    __slots__ = ("events", "event_of")
+
+    def __init__(self, model: ResultsModel, packed: list[tuple]):
+        self.events: dict[tuple, EventPacing] = {}
+        self.event_of: dict[str, EventPacing] = {}
+        if not packed: return
+        uids = [u for u, _, _ in packed]
+        arr = unpack_splits(b"".join(b for _, _, b in packed))
+        race = np.repeat(np.arange(len(packed)), [n for _, n, _ in packed])
+        row_of = {r.id: i for i, r in enumerate(model.rows) if r.id}
+        res_row = np.array([row_of.get(u, -1) for u in uids])
+        for (e, b), idx in model.by_event.items():
+            dist_total = int(model.dist[idx[0]])
+            races = np.flatnonzero(np.isin(res_row, idx))
+            if dist_total < 100 or not len(races): continue
+            races = races[np.argsort(model.date_ord[res_row[races]], kind="stable")]   # chronologique
+            sel = np.isin(race, races)
+            d = arr["dist"][sel].astype(np.int64)
+            step = 25 if (d % 50).any() else 50
+            ncol = dist_total // step
+            col = d // step - 1
+            ok = (d % step == 0) & (col >= 0) & (col < ncol)
+            pos = np.full(len(packed), -1)
+            pos[races] = np.arange(len(races))
+            line = pos[race[sel]]
+            cumul = np.full((len(races), ncol), np.nan)
+            lap = np.full((len(races), ncol), np.nan)
+            c, l = arr["cumul"][sel].astype(float), arr["lap"][sel].astype(float)
+            c[c < 0], l[l < 0] = np.nan, np.nan
+            cumul[line[ok], col[ok]] = c[ok]
+            lap[line[ok], col[ok]] = l[ok]
+            total = model.time_cs[res_row[races]].astype(float)
+            total[total == _NO_TIME] = np.nan
+            dist = np.arange(1, ncol + 1) * step
+            ev = self.events[(e, b)] = EventPacing([uids[i] for i in races], dist, cumul, lap, total)
+            self.event_of.update(dict.fromkeys(ev.uids, ev))
+
+    def event(self, epreuve: str, bassin: str) -> Optional[EventPacing]:
+        return self.events.get((epreuve, bassin))
+
+def format_gap(cs: float) -> str:
+    return f"{cs / 100:+.2f}s"
+
+@functools.lru_cache(maxsize=16)
+def pacing_model(swimmer_id: str, version: int) -> PacingModel:
+    return PacingModel(results_model(swimmer_id, version), STORE.swimmer_splits(swimmer_id))
+
+# ── Graphique de progression ────────────────────────────────────────────────
+
+# Au-delà, on garde le meilleur temps par tranche chronologique (0 = pas de décimation)
+CHART_MAX_POINTS = int(os.environ.get("CHART_MAX_POINTS", "120"))
+CHART_TICKS = 5
+
+def decimate(idx: np.ndarray, time_cs: np.ndarray, max_points: int) -> np.ndarray:
+    """Meilleure perf de chaque tranche + dernière perf : la courbe garde sa forme
+    (records et tendance) avec au plus max_points points."""
+    if not max_points or len(idx) <= max_points: return idx
+    n = len(idx)
+    bucket = np.arange(n) * (max_points - 1) // n
+    order = np.lexsort((time_cs[idx], bucket))          # par tranche, puis par temps
+    b = bucket[order]
+    best = order[np.r_[True, b[1:] != b[:-1]]]
+    return idx[np.union1d(best, [n - 1])]
+
+def tick_labels(vals: np.ndarray) -> list:
+    """Libellés d'axe M:SS (ou Ns sous la minute), calculés d'un bloc."""
+    m, s = np.divmod(vals.astype(np.int64), 60)
+    return [f"{a}:{b:02d}" if a > 0 else f"{b}s" for a, b in zip(m.tolist(), s.tolist())]
+
+@functools.lru_cache(maxsize=64)
+def progression_figure(swimmer_id: str, version: int, nage: str, bassin: str,
+                       category: str, q_cs: int, q_val: str) -> go.Figure:
+    """Figure mémoïsée par (nageur, nage, bassin, catégorie, version des données).
+    Payload minimal : dates ISO, secondes arrondies, pas de template Plotly embarqué."""
+    m = results_model(swimmer_id, version)
+    idx = decimate(m.chronological(nage, bassin), m.time_cs, CHART_MAX_POINTS)
+    f = go.Figure(layout=dict(template=None))
+    if not len(idx): return f
+    ords = m.date_ord[idx]
+    secs = np.round(m.time_cs[idx] / 100, 2)
+    f.add_scatter(
+        x=[date.fromordinal(o).isoformat() for o in ords.tolist()], y=secs.tolist(),
+        text=[m.rows[i].T for i in idx.tolist()], hovertemplate="%{x|%d/%m/%Y}<br>%{text}<extra></extra>",
+        mode='lines+markers', line=dict(color='#3b82f6', width=2),
+        marker=dict(size=10, color='#3b82f6', line=dict(width=2, color='white')),
+    )
+    q_sec = q_cs / 100
+    lo, hi = secs.min(), secs.max()
+    if q_sec: lo, hi = min(lo, q_sec), max(hi, q_sec)
+    tick_vals = np.round(np.linspace(lo * 0.99, hi * 1.01, CHART_TICKS), 2)
+    if bassin == "50m" and q_val:
+        f.add_hline(y=q_sec, line_dash="dash", line_color="#ef4444", line_width=2,
+                    annotation_text=f"Qualif. {category} ({q_val})",
+                    annotation_position="top left", annotation_font_size=11, annotation_font_color="#ef4444")
+    f.update_layout(
+        yaxis=dict(tickmode='array', tickvals=tick_vals.tolist(), ticktext=tick_labels(tick_vals)),
+        margin=dict(l=50, r=20, t=30, b=30), height=230,
+        paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(color="gray", size=10), showlegend=False, dragmode=False,
     )
+    return f
+
+@functools.lru_cache(maxsize=64)
+def progression_json(*key) -> dict:
+    """progression_figure déjà sérialisée, comme le ferait Reflex : la var d'état
+    est un simple dict, sérialisé une fois par (nageur, nage, version)."""
+    fig = json.loads(progression_figure(*key).to_json(validate=False))
+    fig["layout"].pop("template", None)   # plotly réinjecte son template par défaut (~6 Ko)
+    return fig
+
+# ── Préchargement des top 10 ────────────────────────────────────────────────
+
+TOP10_SCOPES = ("dept", "region", "national", "dept_tc", "region_tc", "national_tc")
+PREFETCH_WORKERS = 3
+PRIO_NOW, PRIO_HIGH, PRIO_LOW = 0, 1, 2   # dialog ouvert / nage affichée / remplissage de fond
+
+def top10_job(sai: int, nage: str, bl: str, scope: str, cat: int) -> tuple:
+    """Clé d'un top 10 (mêmes arguments que STORE.top10) ; cat ignorée en TC."""
+    return (sai, nage, bl, scope, 0 if scope.endswith("_tc") else cat)
+
+def tops_stored(job: tuple) -> bool:
+    sai, nage, bl, cat = job
+    return all(STORE.top10(*top10_job(sai, nage, bl, scope, cat)) is not None for scope in TOP10_SCOPES)
+
+class Top10Prefetcher:
+    """File à priorités des top 10 à calculer et ranger dans STORE. Un job =
+    (saison, nage, bassin, catégorie) : une page nationale donne les 6 top 10.
+    Un job déjà en file est remonté si on le redemande plus urgemment."""
+
+    def __init__(self, workers: int = PREFETCH_WORKERS):
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._queued: dict[tuple, int] = {}
+        self._waiters: dict[tuple, list[asyncio.Future]] = {}
+        self._n_workers = workers
+        self._workers: list[asyncio.Task] = []
+        self.stats = {"fetched": 0, "already_stored": 0, "errors": 0}
+
+    def enqueue(self, job: tuple, prio: int = PRIO_LOW):
+        if job[1] not in EPREUVE_CODES or self._queued.get(job, PRIO_LOW + 1) <= prio: return
+        self._queued[job] = prio
+        self._queue.put_nowait((prio, next(self._seq), job))
+        if not self._workers:
+            self._workers = [asyncio.ensure_future(self._worker()) for _ in range(self._n_workers)]
+
+    def enqueue_event(self, sai: int, nage: str, bl: str, cat: int, prio: int = PRIO_HIGH):
+        self.enqueue((sai, nage, bl, cat), prio)
+
+    def enqueue_roster(self, sai: int):
+        """Toutes les épreuves nagées par le roster, en tâche de fond."""
+        for s in ROSTER:
+            for e, b in {(r["E"].rstrip("."), r["B"]) for r in STORE.results(s.id)}:
+                self.enqueue_event(sai, e, b, sai - s.birth_year, PRIO_LOW)
+
+    async def ensure(self, job: tuple):
+        """Attend que les top 10 soient en base (les calcule en priorité absolue si besoin)."""
+        if job[1] not in EPREUVE_CODES or await asyncio.to_thread(tops_stored, job): return
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(job, []).append(fut)
+        self._queued.pop(job, None)
+        self.enqueue(job, PRIO_NOW)
+        await fut
+
+    async def _worker(self):
+        while True:
+            prio, _, job = await self._queue.get()
+            if self._queued.get(job) != prio: continue   # déjà traitée, ou remontée en priorité
+            del self._queued[job]
+            try:
+                if not await asyncio.to_thread(tops_stored, job):
+                    await self._fetch(job)
+                    self.stats["fetched"] += 1
+                else:
+                    self.stats["already_stored"] += 1
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"[prefetch] {job}: {type(e).__name__}: {e}")
+            for fut in self._waiters.pop(job, []):
+                if not fut.done(): fut.set_result(None)
+
+    async def _fetch(self, job: tuple):
+        sai, nage, bl, cat = job
+        bc, idepr = "50" if bl == "50m" else "25", EPREUVE_CODES[nage]
+        table = await fetch_ranking_table(bc, idepr, sai)
+        tops = await ranking_tops(table, bc, idepr, sai, cat)
+        await asyncio.to_thread(STORE.put_ranking_table, sai, nage, bl, cat, {}, tops)
+
+_PREFETCHERS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Top10Prefetcher]" = weakref.WeakKeyDictionary()
+
+def get_prefetcher() -> Top10Prefetcher:
+    return _loop_local(_PREFETCHERS, Top10Prefetcher)
+
+# ── Rafraîchissement serveur ─────────────────────────────────────────────────
+
+# Planning (secondes) : plus serré le week-end, quand ont lieu les compétitions
+REFRESH_EVERY         = int(os.environ.get("FFN_REFRESH_EVERY", 6 * 3600))
+REFRESH_EVERY_WEEKEND = int(os.environ.get("FFN_REFRESH_EVERY_WEEKEND", 3600))
+SCHEDULER_ENABLED     = os.environ.get("FFN_SCHEDULER", "1") != "0"
+SCHEDULER_TICK        = 60
+SCHEDULER_LEASE       = 15 * 60   # un seul process rafraîchit à la fois
+SESSION_POLL          = 15        # les sessions ouvertes vérifient la version à ce rythme
+
+async def refresh_dataset(on_results=None):
+    """Scrape FFN pour tout le roster et écrit dans STORE : performances,
+    puis classements incrémentaux. on_results() est appelé entre les deux.
+    Tout accès à STORE passe par un thread : la boucle ne fait que les requêtes."""
+    sai = current_season_year()
+    old_res = await asyncio.to_thread(lambda: {s.id: STORE.results(s.id) for s in ROSTER})
+    new_res = {s.id: [] for s in ROSTER}
+    fetched_at = await asyncio.to_thread(STORE.pages_fetched, sai)
+
+    # ── 1. Performances (2 pages par nageur) ─────────────────
+    perf_tasks = [(s.id, bc, bl) for s in ROSTER for bc, bl in [("25", "25m"), ("50", "50m")]]
+    pages = await asyncio.gather(*(fetch_url_async(perf_url(sid, bc)) for sid, bc, _ in perf_tasks),
+                                 return_exceptions=True)
+    if all(isinstance(p, Exception) for p in pages): raise pages[0]
+    keep = set()   # nageurs dont une page a échoué : leurs perfs stockées restent telles quelles
+    for (sid, bc, bl), html_content in zip(perf_tasks, pages):
+        if isinstance(html_content, Exception):
+            METRICS.inc("natation_errors_total", where="perf_page", kind=type(html_content).__name__)
+            keep.add(sid)
+            continue
+        with METRICS.span("parse", parser="performances"):
+            perfs = await asyncio.to_thread(lambda: [(bl, perf) for perf in iter_performances(html_content)])
+        METRICS.inc("natation_rows_parsed_total", len(perfs), parser="performances")
+        if not perfs and any(r["B"] == bl for r in old_res[sid]):
+            # Page vide alors que le bassin avait des perfs : page d'erreur servie en 200, pas un effacement
+            METRICS.inc("natation_errors_total", where="perf_page", kind="empty")
+            keep.add(sid)
+        new_res[sid] += perfs
+    def store_results():
+        with STORE.batch():   # une version par phase, pas une par nageur ou par page
+            for sid, perfs in new_res.items():
+                if sid not in keep: STORE.replace_results(sid, perfs)
+        return {s.id: STORE.results(s.id) for s in ROSTER}
+    new_rows = await asyncio.to_thread(store_results)
+    if on_results: await on_results()
+
+    # ── 2. Classements, incrémental ──────────────────────────
+    # Seules les pages des épreuves nagées sont utiles ; on ne refetch que
+    # celles dont les perfs ont changé, ou trop anciennes (RANKINGS_MAX_AGE).
+    now = time.time()
+    swum, due = set(), set()
+    for s in ROSTER:
+        cat = sai - s.birth_year
+        res = new_rows[s.id]
+        swum |= {ranking_page_key(sai, r["E"].rstrip("."), r["B"], cat) for r in res}
+        due  |= {ranking_page_key(sai, e, b, cat) for e, b in changed_pairs(old_res[s.id], res)}
+    tasks_isere = []
+    for t in roster_ranking_tasks(sai):
+        key = ranking_page_key(sai, t[2], t[1], t[5])
+        if key in swum and (key in due or now - fetched_at.get(key, 0) > RANKINGS_MAX_AGE):
+            tasks_isere.append(t)
+    tables = await asyncio.gather(*map(_fetch_one, tasks_isere))
+    def store_rankings():
+        done = []
+        with STORE.batch():   # après le gather, dans son thread : le lot ne retient jamais les écritures des autres
+            for bl, epr_name, cat, ranks, tops in tables:
+                STORE.put_ranking_table(sai, epr_name, bl, cat, ranks, tops)
+                if any(tops.values()) or any(v != "-" for r in ranks.values() for v in r.values()):
+                    done.append(ranking_page_key(sai, epr_name, bl, cat))
+        STORE.mark_pages_fetched(sai, done, now)
+    await asyncio.to_thread(store_rankings)
+
+    get_prefetcher().enqueue_roster(sai)
+
+_refresh_task: Optional[asyncio.Task] = None
+_results_ready: Optional[asyncio.Event] = None
+
+async def refresh_shared(on_results=None):
+    """Un seul rafraîchissement à la fois par process : les appels concurrents attendent le même.
+    Chaque appelant reçoit son on_results hors de la tâche partagée : une session
+    dont le rappel échoue n'interrompt pas le rafraîchissement des autres."""
+    global _refresh_task, _results_ready
+    if _refresh_task is None or _refresh_task.done():
+        ready = _results_ready = asyncio.Event()
+        async def notify(): ready.set()
+        _refresh_task = asyncio.ensure_future(refresh_dataset(notify))
+    task, ready = _refresh_task, _results_ready
+    if on_results:
+        waiter = asyncio.ensure_future(ready.wait())
+        await asyncio.wait((waiter, task), return_when=asyncio.FIRST_COMPLETED)
+        waiter.cancel()
+        if ready.is_set():
+            try:
+                await on_results()
+            except Exception as e:
+                METRICS.inc("natation_errors_total", where="on_results", kind=type(e).__name__)
+                print(f"[refresh] on_results: {type(e).__name__}: {e}")
+    await asyncio.shield(task)
+
+def refresh_interval(now: Optional[datetime] = None) -> int:
+    now = now or datetime.now()
+    return REFRESH_EVERY_WEEKEND if now.weekday() >= 5 else REFRESH_EVERY
+
+async def refresh_scheduler():
+    """Tâche de fond de l'app : rafraîchit le jeu de données partagé selon le planning."""
+    owner = f"{os.getpid()}-{random.getrandbits(32):08x}"
+    last_attempt = 0.0
+    while True:
+        try:
+            last = max(await asyncio.to_thread(STORE.last_update), last_attempt)
+            if (time.time() - last >= refresh_interval()
+                    and await asyncio.to_thread(STORE.acquire_lease, "scheduler", owner, SCHEDULER_LEASE)):
+                last_attempt = time.time()
+                await refresh_shared()
+                if SNAPSHOT_DIR: print(f"[snapshot] {await asyncio.to_thread(build_snapshot)}")
+        except Exception as e:
+            print(f"[scheduler] ERREUR: {type(e).__name__}: {e}")
+        await asyncio.sleep(SCHEDULER_TICK)
+
+# ── Reprise de l'historique (saisons passées) ────────────────────────────────
+
+BACKFILL_ENABLED  = os.environ.get("FFN_BACKFILL", "0") == "1"
+BACKFILL_WORKERS  = int(os.environ.get("FFN_BACKFILL_WORKERS", "3"))
+BACKFILL_RPS      = float(os.environ.get("FFN_BACKFILL_RPS", "2"))   # politesse envers le site FFN
+BACKFILL_BATCH    = 25     # pages par transaction / point de reprise
+BACKFILL_ATTEMPTS = 3      # au-delà, la page en erreur est abandonnée pour cette saison
+BACKFILL_LEASE    = 15 * 60
+
+def backfill_page_key(sai: int, epr: str, bl: str) -> str:
+    return f"{sai}|{epr}|{bl}"
+
+def backfill_jobs(sai: int) -> list:
+    """Tous les jobs d'une saison : une page nationale par (épreuve, bassin),
+    téléchargée une fois et exploitée pour toutes les catégories du roster."""
+    return [(backfill_page_key(sai, epr, bl), (sai, epr, bl)) for bl in POOLS for epr in EPREUVE_CODES]
 
-def _fetch_url(url: str) -> str:
-    """Fetch HTTP avec headers complets imitant Chrome."""
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-        "Accept-Language": "fr-FR,fr;q=0.9",
-        "Referer": "https://ffn.extranat.fr/webffn/nat_rankings.php",
-        "Connection": "keep-alive",
+async def _backfill_page(key: str, job: tuple) -> tuple:
+    sai, epr, bl = job
+    bc, idepr = "50" if bl == "50m" else "25", EPREUVE_CODES[epr]
+    try:
+        table = await fetch_ranking_table(bc, idepr, sai, cache=False)
+        by_cat, tc = {}, {}
+        for cat in sorted({sai - s.birth_year for s in ROSTER}):
+            ids = [s.id for s in ROSTER if sai - s.birth_year == cat]
+            ranks, tops = await asyncio.gather(roster_ranks(table, bc, idepr, sai, cat, ids, cache=False),
+                                               ranking_tops(table, bc, idepr, sai, cat, cache=False, known=tc))
+            if len(tops) < len(NO_RANKS): return (key, "error", epr, bl, {})   # page de repli en échec
+            tc = {scope: top for scope, top in tops.items() if scope.endswith("_tc")}
+            by_cat[cat] = (ranks, tops)
+        return (key, "done" if len(table) else "empty", epr, bl, by_cat)
+    except Exception as e:
+        METRICS.inc("natation_errors_total", where="backfill", kind=type(e).__name__)
+        return (key, "error", epr, bl, {})
+
+async def backfill(seasons=None, workers: int = BACKFILL_WORKERS, rps: float = BACKFILL_RPS, on_batch=None) -> dict:
+    """Classements et top 10 des saisons passées, pages écrites par lots avec leur
+    point de reprise : un parcours interrompu reprend là où il s'était arrêté, et
+    une saison terminée est figée (plus jamais refetchée). on_batch(sai, stats) suit
+    chaque lot écrit, dans un thread comme l'écriture (il peut renouveler un bail)."""
+    cur = current_season_year()
+    seasons = list(seasons or range(await asyncio.to_thread(STORE.first_season) or cur, cur))
+    done_seasons = await asyncio.to_thread(STORE.completed_seasons)
+    # Sous-budget de l'historique, dans le plafond FETCH_CONTROL : toute requête lancée
+    # d'ici (page nationale, pages de repli des tops et des rangs, retries) le consomme
+    budget = FETCH_BUDGET.set(RateLimiter(min(rps, FETCH_MAX_RPS)))
+    try:
+        return await _backfill_seasons(seasons, cur, done_seasons, workers, on_batch)
+    finally:
+        FETCH_BUDGET.reset(budget)
+
+async def _backfill_seasons(seasons: list, cur: int, done_seasons: set, workers: int, on_batch) -> dict:
+    stats = {"seasons": 0, "pages": 0, "errors": 0, "skipped": 0}
+    for sai in seasons:
+        if sai >= cur or sai in done_seasons: continue
+        jobs = backfill_jobs(sai)
+        state = await asyncio.to_thread(STORE.backfill_state, sai)
+        todo = [(k, j) for k, j in jobs
+                if state.get(k, ("", 0))[0] not in ("done", "empty") and state.get(k, ("", 0))[1] < BACKFILL_ATTEMPTS]
+        stats["skipped"] += len(jobs) - len(todo)
+        queue: asyncio.Queue = asyncio.Queue()
+        for item in todo: queue.put_nowait(item)
+        batch: list = []
+
+        async def flush():
+            if not batch: return
+            rows = batch[:]   # les workers continuent de remplir batch pendant l'écriture
+            batch.clear()
+            await asyncio.to_thread(STORE.put_backfill, sai, rows)
+            stats["pages"] += len(rows)
+            stats["errors"] += sum(r[1] == "error" for r in rows)
+            if on_batch: await asyncio.to_thread(on_batch, sai, dict(stats))
+
+        retried: set = set()
+        async def worker():
+            while not queue.empty():
+                key, job = queue.get_nowait()
+                res = await _backfill_page(key, job)
+                if res[1] == "empty" and key not in retried:
+                    # Un 200 sans lignes peut être un raté passager du site : on ne fige
+                    # la page « vide » qu'une fois reconfirmée, en fin de file
+                    retried.add(key)
+                    queue.put_nowait((key, job))
+                    continue
+                batch.append(res)
+                if len(batch) >= BACKFILL_BATCH: await flush()
+
+        await asyncio.gather(*(worker() for _ in range(max(1, workers))))
+        await flush()
+        state = await asyncio.to_thread(STORE.backfill_state, sai)
+        if all(state.get(k, ("", 0))[0] in ("done", "empty") for k, _ in jobs):
+            await asyncio.to_thread(STORE.complete_season, sai, len(jobs))
+            stats["seasons"] += 1
+    return stats
+
+async def backfill_task():
+    """Tâche de fond (FFN_BACKFILL=1) : un seul process parcourt l'historique, bail renouvelé à chaque lot."""
+    owner = f"{os.getpid()}-{random.getrandbits(32):08x}"
+    while True:
+        try:
+            if await asyncio.to_thread(STORE.acquire_lease, "backfill", owner, BACKFILL_LEASE):
+                stats = await backfill(on_batch=lambda *_: STORE.acquire_lease("backfill", owner, BACKFILL_LEASE))
+                print(f"[backfill] {stats}")
+                if not stats["errors"]: return
+        except Exception as e:
+            print(f"[backfill] ERREUR: {type(e).__name__}: {e}")
+        await asyncio.sleep(BACKFILL_LEASE)
+
+# ── API d'export (JSON / CSV / NDJSON) ───────────────────────────────────────
+
+# /api/swimmers.{fmt}, /api/swimmers/{id}/{performances|splits|rankings}.{fmt},
+# /api/top10.{fmt}?saison=&epreuve=&bassin=&categorie=&scope=
+# Payload sérialisé par blocs, gardé en mémoire par (requête, version des données
+# exportées) ; ETag faible dérivé de cette version → 304 sans rien relire. Un top 10
+# écrit ne périme donc pas les exports de performances, et inversement.
+EXPORT_CACHE_BYTES = int(float(os.environ.get("NATATION_EXPORT_CACHE_MB", "32")) * 1024 * 1024)
+EXPORT_CHUNK_ROWS  = 200
+EXPORT_TYPES = {"json": "application/json", "ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+def _export_swimmers(sid, q):
+    for s in ROSTER: yield s.id, s.nom, s.birth_year
+
+def _export_performances(sid, q):
+    for r in STORE.results(sid):
+        yield r["id"], r["E"], r["B"], r["D"], r["T"], r["cs"], r["P"], r["N"], r["V"]
+
+def _export_splits(sid, q):
+    for uid, _, blob in STORE.swimmer_splits(sid):
+        for dist, *times in unpack_splits(blob).tolist():
+            yield (uid, dist, *(None if t < 0 else t for t in times))
+
+def _export_rankings(sid, q):
+    yield from STORE.ranking_rows(sid)
+
+def _export_top10(sid, q):
+    yield from STORE.top10_rows(**{k: int(v) if k in ("saison", "categorie") else v for k, v in q.items()})
+
+# nom → (colonnes, générateur de lignes, par nageur ?, domaine de version ; "" = roster)
+EXPORTS = {
+    "swimmers":     (("id", "nom", "annee_naissance"), _export_swimmers, False, ""),
+    "performances": (("uid", "epreuve", "bassin", "date", "temps", "temps_cs", "points", "competition", "type_compet"),
+                     _export_performances, True, "results"),
+    "splits":       (("uid", "distance", "cumul_cs", "lap_cs", "half_cs"), _export_splits, True, "results"),
+    "rankings":     (("saison", "epreuve", "bassin", "scope", "rang"), _export_rankings, True, "rankings"),
+    "top10":        (("saison", "epreuve", "bassin", "categorie", "scope", "pos", "rang", "nom", "temps", "swimmer_id"),
+                     _export_top10, False, "rankings"),
+}
+
+# Le roster est figé dans le code : son empreinte tient lieu de version
+ROSTER_VERSION = zlib.crc32(repr([(s.id, s.nom, s.birth_year) for s in ROSTER]).encode())
+
+def encode_rows(fmt: str, cols: tuple, rows):
+    """Sérialise au fil des lignes, un bloc d'octets toutes les EXPORT_CHUNK_ROWS lignes."""
+    buf = io.StringIO()
+    if fmt == "csv":
+        w = csv.writer(buf, lineterminator="\n")
+        w.writerow(cols)
+        put = w.writerow
+    elif fmt == "ndjson":
+        put = lambda row: buf.write(json.dumps(dict(zip(cols, row)), ensure_ascii=False) + "\n")
+    else:
+        buf.write("[")
+        sep = itertools.chain([""], itertools.repeat(","))
+        put = lambda row: buf.write(next(sep) + json.dumps(dict(zip(cols, row)), ensure_ascii=False))
+    for k, row in enumerate(rows, 1):
+        put(row)
+        if k % EXPORT_CHUNK_ROWS == 0:
+            yield buf.getvalue().encode()
+            buf.seek(0); buf.truncate()
+    if fmt == "json": buf.write("]")
+    yield buf.getvalue().encode()
+
+class ExportCache:
+    """Payloads déjà sérialisés (listes de blocs), LRU borné en octets. La version
+    du jeu de données fait partie de la clé : une mise à jour les périme toutes."""
+
+    def __init__(self, max_bytes: int = EXPORT_CACHE_BYTES):
+        self.max_bytes, self.size = max_bytes, 0
+        self._entries: "OrderedDict[tuple, list[bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[list[bytes]]:
+        with self._lock:
+            chunks = self._entries.get(key)
+            if chunks is not None: self._entries.move_to_end(key)
+            return chunks
+
+    def fill(self, key: tuple, chunks):
+        """Transmet les blocs au fil de l'eau et ne garde le payload que s'il est complet."""
+        done = []
+        for c in chunks:
+            done.append(c)
+            yield c
+        n = sum(map(len, done))
+        if n > self.max_bytes: return
+        with self._lock:
+            if key in self._entries: return
+            self._entries[key] = done
+            self.size += n
+            while self.size > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self.size -= sum(map(len, old))
+
+EXPORT_CACHE = ExportCache()
+
+async def _iter_cached(chunks: list[bytes]):
+    for c in chunks: yield c
+
+async def export_endpoint(request):
+    kind, fmt, sid = request.path_params["kind"], request.path_params["fmt"], request.path_params.get("sid", "")
+    spec = EXPORTS.get(kind)
+    if fmt not in EXPORT_TYPES or spec is None or spec[2] != bool(sid) or (sid and sid not in ROSTER_BY_ID):
+        return PlainTextResponse("introuvable", status_code=404)
+    cols, rows, _, domain = spec
+    q = dict(sorted(request.query_params.items()))
+    if not all(v.isdigit() for k, v in q.items() if k in ("saison", "categorie")):
+        return PlainTextResponse("saison/categorie : entier attendu", status_code=400)
+    version = STORE.version(domain) if domain else ROSTER_VERSION
+    key = (kind, fmt, sid, tuple(q.items()), version)
+    etag = f'W/"{version}-{zlib.crc32(repr(key[:4]).encode()):08x}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in (t.strip() for t in request.headers.get("if-none-match", "").split(",")):
+        METRICS.inc("natation_export_total", kind=kind, fmt=fmt, cache="not_modified")
+        return Response(status_code=304, headers=headers)
+    chunks = EXPORT_CACHE.get(key)
+    METRICS.inc("natation_export_total", kind=kind, fmt=fmt, cache="hit" if chunks is not None else "miss")
+    body = _iter_cached(chunks) if chunks is not None else EXPORT_CACHE.fill(key, encode_rows(fmt, cols, rows(sid, q)))
+    return StreamingResponse(body, media_type=EXPORT_TYPES[fmt], headers=headers)
+
+EXPORT_ROUTES = [
+    Route("/api/swimmers/{sid}/{kind}.{fmt}", export_endpoint),
+    Route("/api/{kind}.{fmt}", export_endpoint),
+]
+
+# ── Snapshot statique (visiteurs en lecture seule) ──────────────────────────
+
+# Un bundle JSON par (nageur, épreuve, bassin) avec tout ce que calcule l'écran
+# d'une nage, plus la vue /qualif. Noms hachés sur le contenu (cache immuable),
+# copie .gz à côté (gzip_static) ; seul manifest.json change à chaque build.
+# index.html (snapshot_viewer.html) les affiche sans l'app : page d'une nage et /qualif.
+# NATATION_SNAPSHOT_DIR : le scheduler reconstruit après chaque rafraîchissement.
+SNAPSHOT_DIR = os.environ.get("NATATION_SNAPSHOT_DIR", "")
+SNAPSHOT_MANIFEST = "manifest.json"
+SNAPSHOT_VIEWER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshot_viewer.html")   # → index.html
+_SLUG_RE = pattern("slug", r"[^0-9A-Za-z]+")
+
+def _dump(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode()
+
+def snapshot_bundle(swimmer_id: str, version: int, sai: int, nage: str, bassin: str) -> dict:
+    """Mêmes calculs que les vars de State pour (nageur, nage, bassin), sans session."""
+    m = results_model(swimmer_id, version)
+    cat = sai - ROSTER_BY_ID[swimmer_id].birth_year
+    category, epr = f"U{cat}", nage.rstrip(".")
+    best = m.best(nage, bassin)
+    best_cs = best.cs if best and best.cs is not None else 0
+    grid = qualif_grid(bassin, sai)
+    q_cs, q_val = grid.time(cat, nage) if grid else (0, "")
+    hist = STORE.rank_history(swimmer_id, epr, bassin)
+    tops = {scope: STORE.top10(*top10_job(sai, epr, bassin, scope, cat)) for scope in TOP10_SCOPES}
+    return {
+        "nageur": swimmer_id, "epreuve": nage, "bassin": bassin, "categorie": category,
+        "meilleur": best.T if best else "", "meilleur_cs": best_cs,
+        "qualif": {"temps": q_val, "cs": q_cs, "ecart": qualif_gap_txt(best_cs, q_cs, category)},
+        "classements": STORE.rankings(swimmer_id, sai).get(f"{epr}|{bassin}", {}),
+        "historique": [RankSeason(saison=str(s), dept=r.get("dept", "-"), region=r.get("region", "-"),
+                                  national=r.get("national", "-")).model_dump() for s, r in sorted(hist.items(), reverse=True)],
+        "top10": {scope: [Top10Entry(rang=e["rang"], nom=e["nom"], temps=e["temps"], moi=e["id"] == swimmer_id).model_dump()
+                          for e in entries] for scope, entries in tops.items() if entries is not None},
+        "resultats": [r.model_dump() for r in result_rows(swimmer_id, version, nage, bassin)],
+        "graphique": progression_json(swimmer_id, version, nage, bassin, category, q_cs, q_val),
     }
-    opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
-    req = urllib.request.Request(url, headers=headers)
-    with opener.open(req, timeout=15) as resp:
-        return resp.read().decode("utf-8", errors="replace")
-
-def _fetch_one(args: tuple) -> tuple:
-    """Fetche une seule URL — 108 tâches indépendantes en parallèle."""
-    bc, bl, epr_name, idepr, sai, cat, scope = args
-    base = f"https://ffn.extranat.fr/webffn/nat_rankings.php?idact=nat&idopt=sai&go=epr&idbas={bc}&idepr={idepr}&idsai={sai}&idcat={cat}"
-    suffix = {"dept": "&iddep=1611", "region": "&idreg=3004", "national": ""}[scope]
+
+def _write_atomic(path: str, data: bytes):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f: f.write(data)
+    os.replace(tmp, path)
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f: return f.read()
+
+def _manifest_files(manifest: dict) -> set:
+    files = {manifest.get("qualif", "")}
+    for s in manifest.get("nageurs", []):
+        files |= {e["fichier"] for events in s["bassins"].values() for e in events}
+    return files - {""}
+
+def build_snapshot(out_dir: str = "") -> dict:
+    """Écrit les bundles manquants, puis le manifeste ; supprime les fichiers que ni
+    ce manifeste ni le précédent ne référencent (les clients en cours gardent les leurs)."""
+    out_dir = out_dir or SNAPSHOT_DIR or "snapshot"
+    os.makedirs(out_dir, exist_ok=True)
+    version, sai = STORE.version("results"), current_season_year()
+    stats = {"version": STORE.version(), "bundles": 0, "written": 0, "removed": 0, "bytes": 0, "gz_bytes": 0}
+
+    def put(prefix: str, obj) -> str:
+        data = _dump(obj)
+        name = f"{_SLUG_RE.sub('-', prefix).strip('-')}.{hashlib.sha256(data).hexdigest()[:12]}.json"
+        path = os.path.join(out_dir, name)
+        stats["bundles"] += 1
+        stats["bytes"] += len(data)
+        if os.path.exists(path + ".gz"):
+            stats["gz_bytes"] += os.path.getsize(path + ".gz")
+            return name
+        gz = gzip.compress(data, 9, mtime=0)
+        _write_atomic(path, data)
+        _write_atomic(path + ".gz", gz)
+        stats["written"] += 1
+        stats["gz_bytes"] += len(gz)
+        return name
+
+    with METRICS.span("snapshot"):
+        swimmers = []
+        for s in ROSTER:
+            m = results_model(s.id, version)
+            pools = {bl: [{"epreuve": e, "nage": stroke_of(e), "fichier": put(f"{s.id}-{bl}-{e}",
+                                                                             snapshot_bundle(s.id, version, sai, e, bl))}
+                          for e in m.events(bl)] for bl in POOLS}
+            swimmers.append({"id": s.id, "nom": s.nom, "categorie": f"U{sai - s.birth_year}", "bassins": pools})
+        pcts, rows = qualif_overview(version, sai)
+        qualif = put("qualif", [dict(r.model_dump(), pct_num=round(float(p), 2)) for p, r in zip(pcts, rows)])
+        manifest = {"version": stats["version"], "saison": sai, "maj": STORE.last_update(), "genere": time.time(),
+                    "marges_qualif": list(QUALIF_MARGINS), "qualif": qualif, "nageurs": swimmers}
+
+        path = os.path.join(out_dir, SNAPSHOT_MANIFEST)
+        keep = _manifest_files(manifest)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f: keep |= _manifest_files(json.load(f))
+        _write_atomic(path, _dump(manifest))
+        index = os.path.join(out_dir, "index.html")
+        viewer = _read_bytes(SNAPSHOT_VIEWER)
+        if not os.path.exists(index) or _read_bytes(index) != viewer:
+            _write_atomic(index, viewer)   # le lecteur ne change qu'avec le code
+        for name in os.listdir(out_dir):
+            base = name[:-3] if name.endswith(".gz") else name
+            if base != SNAPSHOT_MANIFEST and base.endswith(".json") and base not in keep:
+                os.remove(os.path.join(out_dir, name))
+                stats["removed"] += 1
+    return stats
+
+# ── Démarrage à froid ────────────────────────────────────────────────────────
+
+# numpy/plotly sont différés (_LazyModule) ; dès que le serveur écoute, un thread
+# les importe et précalcule les modèles du roster pour que la première requête
+# ne paie ni les imports ni les calculs. NATATION_WARMUP=0 : tout reste paresseux.
+WARMUP_ENABLED = os.environ.get("NATATION_WARMUP", "1") != "0"
+
+def warm_up() -> float:
+    t0 = time.perf_counter()
+    go.Figure(layout=dict(template=None)).to_json(validate=False)   # numpy, plotly et son moteur JSON
+    version, sai = STORE.version("results"), current_season_year()
+    for s in ROSTER:
+        results_model(s.id, version)
+        pacing_model(s.id, version)
+    qualif_overview(version, sai)
+    dt = time.perf_counter() - t0
+    METRICS.set("natation_warmup_seconds", dt)
+    return dt
+
+async def warmup_task():
     try:
-        h = _fetch_url(base + suffix)
-        rank = parse_ranking_row(h) if scope == "dept" else None
-        top  = parse_top10(h)
-        return (bl, epr_name, scope, rank, top)
-    except:
-        fallback_rank = {"dept": "-", "region": "-", "national": "-"} if scope == "dept" else None
-        return (bl, epr_name, scope, fallback_rank, [])
+        print(f"[warmup] {await asyncio.to_thread(warm_up):.2f}s")
+    except Exception as e:
+        print(f"[warmup] ERREUR: {type(e).__name__}: {e}")
+
+def connected_tokens():
+    ns = app.event_namespace
+    return ns.token_to_sid if ns is not None else {}
 
 def flag_svg():
     return rx.box(
@@ -244,16 +2517,17 @@ def flag_svg():
     )
 
 class State(rx.State):
+    swimmer_id: str = ROSTER[0].id
     current_bassin: str = "50m"
     selected_nage_state: str = ""
-    results_json: str = rx.LocalStorage("[]", name="swim_v92")
-    last_update_str_store: str = rx.LocalStorage("0", name="up_v92")
+    # Versions des données dans STORE : seules « données » tenues par la session
+    results_version: int = 0
+    rankings_version: int = 0
+    last_update: float = 0.0
     loading: bool = False
-    rankings_json: str = rx.LocalStorage("{}", name="rank_v96")
-    top10_json: str = rx.LocalStorage("{}", name="top10_v4")
     top10_dialog_open: bool = False
     top10_dialog_title: str = ""
-    top10_dialog_key: str = ""
+    top10_dialog_scope: str = ""
     top10_loading: bool = False
     dialog_open: bool = False
     dialog_key:  str = ""
@@ -261,143 +2535,215 @@ class State(rx.State):
     dialog_type: str = ""
     dialog_date: str = ""
     dialog_splits_data: list[SplitRow] = []
-
-    def on_load(self): pass
+    qualif_margin: int = QUALIF_MARGINS[1]
+    results_page: int = 0
+
+    _watching: bool = False
+
+    def on_load(self):
+        self.sync_store()
+        return State.watch_store
+
+    @rx.event(background=True)
+    async def watch_store(self):
+        """Pousse vers cette session les nouvelles versions écrites par le scheduler."""
+        async with self:
+            if self._watching: return
+            self._watching = True
+        token = self.router.session.client_token
+        try:
+            while token in connected_tokens():
+                await asyncio.sleep(SESSION_POLL)
+                if STORE.versions() != {"results": self.results_version, "rankings": self.rankings_version}:
+                    async with self: self.sync_store()
+        finally:
+            async with self: self._watching = False
+
+    def sync_store(self):
+        """N'affecte que ce qui a changé : seules les vars du domaine modifié sont recalculées."""
+        v = STORE.versions()
+        if v["results"] != self.results_version: self.results_version = v["results"]
+        if v["rankings"] != self.rankings_version: self.rankings_version = v["rankings"]
+        last = STORE.last_update()
+        if last != self.last_update: self.last_update = last
+
+    @_override_base_method   # point d'extension prévu par build_delta
+    def get_delta(self):
+        """Delta envoyé au client : construction (vars calculées) chronométrée, et
+        sérialisation JSON mesurée sur un échantillon (elle serait sinon faite deux fois)."""
+        with METRICS.span("state.delta"):
+            delta = super().get_delta()
+        if random.random() < DELTA_SAMPLE:
+            try:
+                with METRICS.span("state.serialize"):
+                    size = len(rx_format.json_dumps(delta))
+                METRICS.inc("natation_state_delta_bytes_total", size)
+                METRICS.inc("natation_state_delta_sampled_total")
+            except Exception:
+                pass
+        return delta
 
     @rx.var(cache=True)
     def selected_nage(self) -> str:
         return self.selected_nage_state
 
-    def change_bassin(self, v: Union[str, list[str]]):
+    async def change_bassin(self, v: Union[str, list[str]]):
         self.current_bassin = v[0] if isinstance(v, list) else v
+        self.results_page = 0
+        self.prefetch_top10()
         return rx.call_script("window.scrollTo({top: 0, behavior: 'instant'})")
 
     @rx.var(cache=True)
-    def current_category(self) -> str: return f"U{current_season_year() - BIRTH_YEAR}"
+    def swimmer(self) -> str:
+        return ROSTER_BY_ID.get(self.swimmer_id, ROSTER[0]).nom
 
-    def to_sec(self, t):
-        try:
-            t = str(t).replace(" ", "").strip()
-            if ":" in t:
-                m, s = t.split(":")
-                return int(m) * 60 + float(s)
-            return float(t)
-        except: return 9999.0
+    @rx.var(cache=True)
+    def roster_names(self) -> list[str]:
+        return [s.nom for s in ROSTER]
 
-    def format_min_sec_short(self, s):
-        m = int(s // 60); sec = int(s % 60)
-        return f"{m}:{sec:02d}" if m > 0 else f"{sec}s"
+    def select_swimmer(self, nom: str):
+        self.swimmer_id = next((s.id for s in ROSTER if s.nom == nom), ROSTER[0].id)
+        self.selected_nage_state = ""
+        self.results_page = 0
 
-    def get_qualif_key(self, nage_full: str) -> str:
-        n = nage_full.upper()
-        dist = re.search(r'\d+', n).group() if re.search(r'\d+', n) else ""
-        type_n = "NL" if "NL" in n or "LIBRE" in n else "Bra" if "BRA" in n else "Dos" if "DOS" in n else "Pap" if "PAP" in n else "4 N" if "4 N" in n else ""
-        return f"{dist} {type_n}".strip()
+    @rx.var(cache=True)
+    def category_num(self) -> int:
+        return current_season_year() - ROSTER_BY_ID.get(self.swimmer_id, ROSTER[0]).birth_year
+
+    @rx.var(cache=True)
+    def current_category(self) -> str: return f"U{self.category_num}"
 
     @rx.var(cache=True)
     def qualif_time_val(self) -> str:
-        if self.current_bassin != "50m": return ""
-        return GRILLE_QUALIF_FULL.get(self.current_category, {}).get(self.get_qualif_key(self.selected_nage), "")
+        if not self.selected_nage: return ""   # état initial : ni grille ni numpy à charger
+        grid = qualif_grid(self.current_bassin, current_season_year())
+        return grid.time(self.category_num, self.selected_nage)[1] if grid else ""
+
+    @rx.var(cache=True)
+    def qualif_time_cs(self) -> int:
+        if not self.selected_nage: return 0
+        grid = qualif_grid(self.current_bassin, current_season_year())
+        return grid.time(self.category_num, self.selected_nage)[0] if grid else 0
 
     @rx.var(cache=True)
     def qualif_time_formatted(self) -> str:
         """Formate le temps de qualif au même format que FFN : MM:SS.ss ou 00:SS.ss."""
-        t = self.qualif_time_val
-        if not t: return ""
-        try:
-            secs = self.to_sec(t)
-            m = int(secs // 60)
-            s = secs - m * 60
-            return f"{m:02d}:{s:05.2f}"
-        except: return t
+        return format_cs(self.qualif_time_cs) if self.qualif_time_cs else ""
 
     @rx.var(cache=True)
     def gap_to_qualif_txt(self) -> str:
-        if not self.qualif_time_val or not self.best_time_val: return ""
-        diff = self.to_sec(self.best_time_val) - self.to_sec(self.qualif_time_val)
-        return "Qualifié ! 🎉" if diff <= 0 else f"+{diff:.2f}s (Cible {self.current_category})"
+        return qualif_gap_txt(self.best_time_cs, self.qualif_time_cs, self.current_category)
+
+    @rx.var(cache=True)
+    def qualif_rows(self) -> list[QualifRow]:
+        """Page /qualif : couples (nageur, épreuve) qualifiés ou à moins de qualif_margin % du temps limite."""
+        if not self.results_version: return []
+        pcts, rows = qualif_overview(self.results_version, current_season_year())
+        return rows[:int(np.searchsorted(pcts, self.qualif_margin, side="right"))]
+
+    def set_qualif_margin(self, v: Union[str, list[str]]):
+        self.qualif_margin = int(v[0] if isinstance(v, list) else v)
+
+    @rx.var(cache=True)
+    def pacing_txt(self) -> str:
+        """Course idéale (meilleurs partiels) et allure moyenne sur l'épreuve affichée."""
+        if not self.results_version or not self.selected_nage: return ""
+        ev = pacing_model(self.swimmer_id, self.results_version).event(self.selected_nage, self.current_bassin)
+        if ev is None or ev.ideal is None: return ""
+        txt = f"Course idéale : {format_cs(round(ev.ideal))}"
+        if ev.pb is not None: txt += f" ({format_gap(ev.ideal - ev.laps[ev.pb].sum())} vs record)"
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            half, fade = np.nanmean(ev.half_diff), np.nanmean(ev.fade)
+        if not np.isnan(half): txt += f" · 2e moitié : {format_gap(half)}"
+        if not np.isnan(fade): txt += f" · fin de course {fade:+.0f} %"
+        return txt
 
     @rx.var(cache=True)
     def last_up_display(self) -> str:
         try:
-            val = float(self.last_update_str_store)
+            val = self.last_update
             if val <= 0: return ""
             from datetime import timezone
             dt = datetime.fromtimestamp(val, tz=timezone.utc).astimezone()
             return f"MAJ : {dt.strftime('%d/%m/%Y %H:%M')}"
         except: return ""
 
-    @rx.var(cache=True)
-    def current_results_list(self) -> list[Result]:
-        try: return [Result(**r) for r in json.loads(self.results_json)]
-        except: return []
-
     @rx.var(cache=True)
     def available_nages(self) -> list[str]:
-        return sorted(
-            list({r.E for r in self.current_results_list if r.B == self.current_bassin}),
-            key=lambda x: int(re.search(r'\d+', x).group()) if re.search(r'\d+', x) else 0,
-        )
+        if not self.results_version: return []
+        return results_model(self.swimmer_id, self.results_version).events(self.current_bassin)
 
     @rx.var(cache=True)
     def nages_nl(self) -> list[str]:
-        return [n for n in self.available_nages if "NL" in n.upper() or "LIBRE" in n.upper()]
+        if not self.results_version: return []
+        return results_model(self.swimmer_id, self.results_version).events(self.current_bassin, "NL")
 
     @rx.var(cache=True)
     def nages_bra(self) -> list[str]:
-        return [n for n in self.available_nages if "BRA" in n.upper()]
+        if not self.results_version: return []
+        return results_model(self.swimmer_id, self.results_version).events(self.current_bassin, "Bra")
 
     @rx.var(cache=True)
     def nages_pap(self) -> list[str]:
-        return [n for n in self.available_nages if "PAP" in n.upper()]
+        if not self.results_version: return []
+        return results_model(self.swimmer_id, self.results_version).events(self.current_bassin, "Pap")
 
     @rx.var(cache=True)
     def nages_dos(self) -> list[str]:
-        return [n for n in self.available_nages if "DOS" in n.upper()]
+        if not self.results_version: return []
+        return results_model(self.swimmer_id, self.results_version).events(self.current_bassin, "Dos")
 
     @rx.var(cache=True)
     def nages_4n(self) -> list[str]:
-        return [n for n in self.available_nages if "4 N" in n.upper()]
+        if not self.results_version: return []
+        return results_model(self.swimmer_id, self.results_version).events(self.current_bassin, "4 N")
 
+    # Tableau paginé : changer de page ne recalcule (et n'envoie) que ces vars-là
     @rx.var(cache=True)
-    def filtered_data(self) -> list[Result]:
+    def results_count(self) -> int:
+        if not self.selected_nage: return 0
+        return len(result_rows(self.swimmer_id, self.results_version, self.selected_nage, self.current_bassin))
+
+    @rx.var(cache=True)
+    def results_page_rows(self) -> list[ResultRow]:
         if not self.selected_nage: return []
-        d = [r for r in self.current_results_list if r.E == self.selected_nage and r.B == self.current_bassin]
-        return sorted(d, key=lambda x: datetime.strptime(x.D, "%d/%m/%Y"), reverse=True)
+        start = self.results_page * RESULTS_PAGE_SIZE
+        return result_rows(self.swimmer_id, self.results_version, self.selected_nage,
+                           self.current_bassin)[start:start + RESULTS_PAGE_SIZE]
+
+    @rx.var(cache=True)
+    def results_page_txt(self) -> str:
+        start = self.results_page * RESULTS_PAGE_SIZE
+        return f"{start + 1}–{min(start + RESULTS_PAGE_SIZE, self.results_count)} / {self.results_count}"
+
+    @rx.var(cache=True)
+    def results_has_more(self) -> bool:
+        return (self.results_page + 1) * RESULTS_PAGE_SIZE < self.results_count
+
+    def results_next(self):
+        if self.results_has_more: self.results_page += 1
+
+    def results_prev(self):
+        self.results_page = max(0, self.results_page - 1)
 
     @rx.var(cache=True)
     def best_time_val(self) -> str:
-        if not self.filtered_data: return ""
-        try: return min(self.filtered_data, key=lambda x: self.to_sec(x.T)).T
-        except: return ""
+        if not self.selected_nage: return ""
+        best = results_model(self.swimmer_id, self.results_version).best(self.selected_nage, self.current_bassin)
+        return best.T if best else ""
+
+    @rx.var(cache=True)
+    def best_time_cs(self) -> int:
+        if not self.selected_nage: return 0
+        best = results_model(self.swimmer_id, self.results_version).best(self.selected_nage, self.current_bassin)
+        return best.cs if best and best.cs is not None else 0
 
     @rx.var(cache=True)
-    def plot_fig(self) -> go.Figure:
-        d = sorted(self.filtered_data, key=lambda x: datetime.strptime(x.D, "%d/%m/%Y"))
-        if not d: return go.Figure()
-        dates = [datetime.strptime(x.D, "%d/%m/%Y") for x in d]
-        secs  = [self.to_sec(x.T) for x in d]
-        f = go.Figure(go.Scatter(
-            x=dates, y=secs, mode='lines+markers',
-            text=[f"{x.D}<br>{x.T}" for x in d], hoverinfo='text',
-            line=dict(color='#3b82f6', width=2),
-            marker=dict(size=10, color='#3b82f6', line=dict(width=2, color='white')),
-        ))
-        q_val = self.qualif_time_val
-        vals  = secs + ([self.to_sec(q_val)] if q_val else [])
-        min_v, max_v = min(vals) * 0.99, max(vals) * 1.01
-        tick_vals = np.linspace(min_v, max_v, 5)
-        if self.current_bassin == "50m" and q_val:
-            f.add_hline(y=self.to_sec(q_val), line_dash="dash", line_color="#ef4444", line_width=2,
-                        annotation_text=f"Qualif. {self.current_category} ({q_val})",
-                        annotation_position="top left", annotation_font_size=11, annotation_font_color="#ef4444")
-        f.update_layout(
-            yaxis=dict(tickmode='array', tickvals=tick_vals, ticktext=[self.format_min_sec_short(v) for v in tick_vals]),
-            margin=dict(l=50, r=20, t=30, b=30), height=230,
-            paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
-            font=dict(color="gray", size=10), showlegend=False, dragmode=False,
-        )
-        return f
+    def plot_fig(self) -> dict:
+        if not self.results_version or not self.selected_nage: return {}
+        return progression_json(self.swimmer_id, self.results_version, self.selected_nage, self.current_bassin,
+                                  self.current_category, self.qualif_time_cs, self.qualif_time_val)
 
     @rx.var(cache=True)
     def dialog_has_50m_splits(self) -> bool:
@@ -417,16 +2763,18 @@ class State(rx.State):
         self.dialog_lieu = lieu
         self.dialog_type = type_compet
         self.dialog_date = date
-        # Parser les splits uniquement pour ce résultat
-        rows: list[SplitRow] = []
-        for r in self.filtered_data:
-            if r.D + r.T == key and r.S:
-                for seg in r.S.split(SEP_SPLIT):
-                    parts = seg.split(SEP_CHAMP)
-                    if len(parts) == 4:
-                        rows.append(SplitRow(dist=parts[0]+"m", cumul=parts[1], partiel=parts[2], half=parts[3]))
-                break
-        self.dialog_splits_data = rows
+        # Splits chargés à la demande, par identifiant de performance
+        fmt = lambda cs: format_cs(int(cs)) if cs >= 0 else ""
+        with METRICS.span("handler", handler="open_dialog"):
+            # Écart au record à chaque passage (vide pour le record lui-même)
+            ev = pacing_model(self.swimmer_id, self.results_version).event_of.get(key)
+            r = ev.row(key) if ev else None
+            gaps = {} if r is None or r == ev.pb else {
+                int(d): format_gap(g) for d, g in zip(ev.dist, ev.cumul_vs_pb[r]) if not np.isnan(g)}
+            self.dialog_splits_data = [
+                SplitRow(dist=f"{d}m", cumul=fmt(c), partiel=fmt(l), half=fmt(h), ecart=gaps.get(d, ""))
+                for d, c, l, h in STORE.splits(key).tolist()
+            ]
         self.dialog_open = True
 
     def close_dialog(self):
@@ -434,7 +2782,8 @@ class State(rx.State):
 
     @rx.var(cache=True)
     def current_rankings(self) -> dict:
-        try: return json.loads(self.rankings_json)
+        _ = self.rankings_version
+        try: return STORE.rankings(self.swimmer_id, current_season_year())
         except: return {}
 
     @rx.var(cache=True)
@@ -445,54 +2794,33 @@ class State(rx.State):
         key = f"{nage}|{self.current_bassin}"
         return self.current_rankings.get(key, {"dept": "—", "region": "—", "national": "—"})
 
-    def force_refresh(self):
-        if self.loading: return
-        self.loading = True
-        yield
-        all_res = []
-        all_ranks = {}
-        all_top10 = {}
-        sai = current_season_year()
-        cat = sai - BIRTH_YEAR
-
+    @rx.var(cache=True)
+    def rank_history(self) -> list[RankSeason]:
+        """Rangs par catégorie saison après saison (saisons passées : reprise de l'historique)."""
+        _ = self.rankings_version
+        hist = STORE.rank_history(self.swimmer_id, self.selected_nage.rstrip("."), self.current_bassin)
+        return [RankSeason(saison=str(sai), dept=r.get("dept", "-"), region=r.get("region", "-"), national=r.get("national", "-"))
+                for sai, r in sorted(hist.items(), reverse=True)]
+
+    @rx.event(background=True)
+    async def force_refresh(self):
+        """Bouton refresh : lance (ou rejoint) le rafraîchissement partagé, sans
+        bloquer l'état de la session pendant les requêtes FFN."""
+        async with self:
+            if self.loading: return
+            self.loading = True
+        async def on_results():
+            async with self: self.sync_store()
         try:
-            # ── 1. Performances ──────────────────────────────────────
-            for bc, bl in [("25", "25m"), ("50", "50m")]:
-                url = f"https://ffn.extranat.fr/webffn/nat_recherche.php?idact=nat&idrch_id=3518107&idopt=prf&idbas={bc}"
-                html_content = _fetch_url(url)
-                rows = find_all(r"<tr\b[^>]*class=[^>]*border-b[^>]*>(.*?)</tr>", html_content)
-                for row in rows:
-                    perf = parse_row(row)
-                    if perf:
-                        all_res.append({
-                            "E": perf.epreuve, "T": perf.temps_final, "P": perf.points,
-                            "D": perf.date, "B": bl, "S": encode_splits(perf.splits),
-                            "N": perf.competition, "V": perf.type_compet,
-                        })
-            self.results_json = json.dumps(all_res)
-            self.last_update_str_store = str(time.time())
-            yield
-
-            # ── 2. Classements Isère uniquement (36 requêtes) ────────
-            tasks_isere = [
-                (bc, bl, epr_name, idepr, sai, cat, "dept")
-                for bc, bl in [("25", "25m"), ("50", "50m")]
-                for epr_name, idepr in EPREUVE_CODES.items()
-            ]
-            all_top10 = {}
-            with ThreadPoolExecutor(max_workers=12) as ex:
-                for bl, epr_name, scope, rank, top in ex.map(_fetch_one, tasks_isere):
-                    all_ranks[f"{epr_name}|{bl}"]          = rank
-                    all_top10[f"{epr_name}|{bl}|dept"]     = top
-
-            self.rankings_json = json.dumps(all_ranks)
-            self.top10_json    = json.dumps(all_top10)
-
+            with METRICS.span("handler", handler="force_refresh"):
+                await refresh_shared(on_results)
         except Exception as e:
+            METRICS.inc("natation_errors_total", where="force_refresh", kind=type(e).__name__)
             print(f"[force_refresh] ERREUR: {type(e).__name__}: {e}")
         finally:
-            self.loading = False
-            yield
+            async with self:
+                self.sync_store()
+                self.loading = False
 
     @rx.var(cache=True)
     def ranking_national_txt(self) -> str:
@@ -524,70 +2852,59 @@ class State(rx.State):
 
     @rx.var(cache=True)
     def top10_dialog_data(self) -> list[Top10Entry]:
+        _ = self.rankings_version
+        if not self.top10_dialog_scope: return []
         try:
-            d = json.loads(self.top10_json)
-            entries = d.get(self.top10_dialog_key, [])
-            return [Top10Entry(**e) for e in entries]
+            entries = STORE.top10(current_season_year(), self.selected_nage.rstrip("."), self.current_bassin,
+                                  self.top10_dialog_scope, self.category_num) or []
+            return [Top10Entry(rang=e["rang"], nom=e["nom"], temps=e["temps"], moi=e["id"] == self.swimmer_id) for e in entries]
         except:
             return []
 
-    def open_top10(self, scope: str):
+    async def open_top10(self, scope: str):
         """scope: 'national','region','dept','national_tc','region_tc','dept_tc'"""
         nage = self.selected_nage.rstrip(".")
-        self.top10_dialog_key = f"{nage}|{self.current_bassin}|{scope}"
+        cat = self.category_num
+        bl = self.current_bassin
+        sai = current_season_year()
+        self.top10_dialog_scope = scope
         tc = scope.endswith("_tc")
         base_scope = scope.replace("_tc", "")
         labels = {"national": "France", "region": "AURA", "dept": "Isère"}
-        cat = current_season_year() - BIRTH_YEAR
         suffix = " TC" if tc else f" U{cat}"
-        self.top10_dialog_title = f"Top 10 {labels[base_scope]}{suffix} — {nage} ({self.current_bassin})"
+        self.top10_dialog_title = f"Top 10 {labels[base_scope]}{suffix} — {nage} ({bl})"
         self.top10_dialog_open = True
-        # Vérifier si déjà en cache
-        all_top10 = json.loads(self.top10_json) if self.top10_json not in ("{}", "") else {}
-        if f"{nage}|{self.current_bassin}|{scope}" in all_top10:
+        # Vérifier si déjà en base (en général préchargé par nav_to_nage)
+        with METRICS.span("handler", handler="open_top10", cached=True):
+            hit = STORE.top10(*top10_job(sai, nage, bl, scope, cat)) is not None
+        if hit:
+            METRICS.inc("natation_top10_open_total", cached=True)
             return
+        METRICS.inc("natation_top10_open_total", cached=False)
         self.top10_loading = True
         yield
-        idepr = EPREUVE_CODES.get(nage, None)
-        if idepr is None:
-            self.top10_loading = False
-            return
-        sai = current_season_year()
-        cat_val = sai - BIRTH_YEAR
-        bc = "50" if self.current_bassin == "50m" else "25"
-        bl = self.current_bassin
-        # URL de base — TC = sans idcat
-        if tc:
-            base_url = f"https://ffn.extranat.fr/webffn/nat_rankings.php?idact=nat&idopt=sai&go=epr&idbas={bc}&idepr={idepr}&idsai={sai}"
-            suffix_map = {"national_tc": "", "region_tc": "&idreg=3004", "dept_tc": "&iddep=1611"}
-            url = base_url + suffix_map[scope]
-            try:
-                h = _fetch_url(url)
-                top = parse_top10(h)
-                all_top10[f"{nage}|{bl}|{scope}"] = top
-            except:
-                all_top10[f"{nage}|{bl}|{scope}"] = []
-        else:
-            base_url = f"https://ffn.extranat.fr/webffn/nat_rankings.php?idact=nat&idopt=sai&go=epr&idbas={bc}&idepr={idepr}&idsai={sai}&idcat={cat_val}"
-            suffix_map = {"national": "", "region": "&idreg=3004", "dept": "&iddep=1611"}
-            url = base_url + suffix_map[scope]
-            try:
-                h = _fetch_url(url)
-                top = parse_top10(h)
-                all_top10[f"{nage}|{bl}|{scope}"] = top
-            except:
-                all_top10[f"{nage}|{bl}|{scope}"] = []
-        self.top10_json = json.dumps(all_top10)
+        with METRICS.span("handler", handler="open_top10", cached=False):
+            await get_prefetcher().ensure((sai, nage, bl, cat))
+        self.sync_store()
         self.top10_loading = False
 
     def close_top10(self):
         self.top10_dialog_open = False
 
-    def nav_to_nage(self, n: str):
+    async def nav_to_nage(self, n: str):
         self.selected_nage_state = n
+        self.results_page = 0
+        self.prefetch_top10()
+
+    def prefetch_top10(self):
+        """Met en file haute priorité les 6 top 10 de la nage affichée."""
+        if self.selected_nage_state:
+            get_prefetcher().enqueue_event(current_season_year(), self.selected_nage_state.rstrip("."),
+                                           self.current_bassin, self.category_num, PRIO_HIGH)
 
     def nav_back(self):
         self.selected_nage_state = ""
+        self.results_page = 0
 
 # ── 5. COMPOSANTS UI ─────────────────────────────────────────────────────────
 
@@ -649,6 +2966,52 @@ def top10_dialog() -> rx.Component:
         on_open_change=State.close_top10,
     )
 
+def rank_season_ui(r: RankSeason) -> rx.Component:
+    return rx.hstack(
+        rx.text(r.saison, font_size="0.7em", font_weight="bold", color=rx.color("gray", 11), width="40px"),
+        rx.text(f"Isère {r.dept} · AURA {r.region} · France {r.national}", font_size="0.7em", color=rx.color("gray", 11)),
+        spacing="2", align="center",
+    )
+
+def qualif_row_ui(r: QualifRow) -> rx.Component:
+    return rx.hstack(
+        rx.vstack(
+            rx.text(f"{r.epreuve} · {r.nom}", font_size="0.8em", font_weight="bold", color=rx.color("gray", 12)),
+            rx.text(f"{r.grille} : {r.cible} · record {r.meilleur}", font_size="0.7em", color=rx.color("gray", 10)),
+            spacing="0", align_items="start",
+        ),
+        rx.spacer(),
+        rx.badge(rx.cond(r.ok, "Qualifié", f"{r.ecart} ({r.pct})"), color_scheme=rx.cond(r.ok, "green", "orange"), variant="soft"),
+        width="100%", align="center", padding_y="6px", border_bottom=f"1px solid {rx.color('gray', 4)}",
+    )
+
+def qualif_page():
+    return rx.theme(
+        rx.center(
+            rx.vstack(
+                rx.hstack(
+                    rx.button(rx.icon(tag="chevron-left"), on_click=rx.redirect("/"), variant="ghost", color_scheme="blue"),
+                    rx.heading("Qualifications", size="5", color=rx.color("gray", 12)),
+                    rx.spacer(),
+                    rx.color_mode.button(variant="ghost"),
+                    width="100%", align="center",
+                ),
+                rx.segmented_control.root(
+                    *[rx.segmented_control.item(f"≤ {m} %", value=str(m)) for m in QUALIF_MARGINS],
+                    on_change=State.set_qualif_margin, value=State.qualif_margin.to_string(), width="100%",
+                ),
+                rx.cond(
+                    State.qualif_rows.length() > 0,
+                    rx.vstack(rx.foreach(State.qualif_rows, qualif_row_ui), spacing="0", width="100%"),
+                    rx.text("Aucune épreuve dans cette marge.", font_size="0.8em", color=rx.color("gray", 10)),
+                ),
+                spacing="4", width=["98%", "500px"], padding="0.8em",
+            ),
+            min_height="0",
+        ),
+        appearance="inherit",
+    )
+
 def split_row_ui(s: SplitRow) -> rx.Component:
     """Avec partiel bleu (splits aux 50m) + half vert optionnel."""
     return rx.hstack(
@@ -660,7 +3023,9 @@ def split_row_ui(s: SplitRow) -> rx.Component:
             rx.text("[" + s.half + "]", font_size="0.72em", color=rx.color("green", 9)),
             rx.box(),
         ),
-        spacing="2", align="center",
+        rx.spacer(),
+        rx.text(s.ecart, font_size="0.68em", color=rx.cond(s.ecart.startswith("+"), rx.color("red", 9), rx.color("green", 9))),
+        spacing="2", align="center", width="100%",
     )
 
 def split_row_ui_100m(s: SplitRow) -> rx.Component:
@@ -673,7 +3038,9 @@ def split_row_ui_100m(s: SplitRow) -> rx.Component:
             rx.text("[" + s.half + "]", font_size="0.72em", color=rx.color("green", 9)),
             rx.box(),
         ),
-        spacing="2", align="center",
+        rx.spacer(),
+        rx.text(s.ecart, font_size="0.68em", color=rx.cond(s.ecart.startswith("+"), rx.color("red", 9), rx.color("green", 9))),
+        spacing="2", align="center", width="100%",
     )
 
 def splits_dialog() -> rx.Component:
@@ -735,12 +3102,21 @@ def index():
             # ── Page d'accueil ───────────────────────────────────────
             rx.vstack(
                 rx.hstack(
-                    rx.heading("Tristan Swim 🏊‍♂️", size="7", color=rx.color("gray", 12)),
+                    rx.heading(f"{State.swimmer} Swim 🏊‍♂️", size="7", color=rx.color("gray", 12)),
                     rx.spacer(),
+                    rx.button(rx.icon(tag="trophy"), on_click=rx.redirect("/qualif"), variant="ghost"),
                     rx.color_mode.button(variant="ghost"),
                     rx.button(rx.icon(tag="refresh-cw"), on_click=State.force_refresh, variant="ghost", loading=State.loading),
                     width="100%", align="center",
                 ),
+                rx.cond(
+                    State.roster_names.length() > 1,
+                    rx.vstack(
+                        rx.text("Nageur", style=l_style),
+                        rx.select(State.roster_names, value=State.swimmer, on_change=State.select_swimmer, width="100%"),
+                        width="100%", align_items="start", spacing="0",
+                    ),
+                ),
                 rx.vstack(
                     rx.text("Bassin", style=l_style),
                     rx.segmented_control.root(
@@ -890,6 +3266,10 @@ def index():
                         ),
                         default_value="cat", width="100%",
                     ),
+                    rx.cond(
+                        State.rank_history.length() > 1,
+                        rx.vstack(rx.foreach(State.rank_history, rank_season_ui), spacing="0", width="100%", padding_top="6px"),
+                    ),
                     spacing="1", align_items="start",
                     width="100%",
                     padding="8px 12px",
@@ -907,24 +3287,37 @@ def index():
                     ),
                     rx.table.body(
                         rx.foreach(
-                            State.filtered_data,
+                            State.results_page_rows,
                             lambda r: rx.table.row(
                                 rx.table.cell(r.D),
-                                rx.table.cell(rx.text(r.T, font_weight=rx.cond(r.T == State.best_time_val, "bold", "normal"), color=rx.cond(r.T == State.best_time_val, rx.color("blue", 9), rx.color("gray", 12)))),
+                                rx.table.cell(rx.text(r.T, font_weight=rx.cond(r.pb, "bold", "normal"), color=rx.cond(r.pb, rx.color("blue", 9), rx.color("gray", 12)))),
                                 rx.table.cell(rx.text(r.P, color=rx.color("gray", 11))),
                                 cursor="pointer",
                                 _hover={"background_color": "var(--gray-3)"},
-                                on_click=State.open_dialog(r.D + r.T, r.N, r.V, r.D),
+                                on_click=State.open_dialog(r.id, r.N, r.V, r.D),
                             ),
                         ),
                     ),
                     width="100%", size="1", variant="surface",
                 ),
+                rx.cond(
+                    State.results_count > RESULTS_PAGE_SIZE,
+                    rx.hstack(
+                        rx.button(rx.icon(tag="chevron-left"), on_click=State.results_prev, variant="ghost", disabled=State.results_page == 0),
+                        rx.text(State.results_page_txt, font_size="0.75em", color=rx.color("gray", 11)),
+                        rx.button(rx.icon(tag="chevron-right"), on_click=State.results_next, variant="ghost", disabled=~State.results_has_more),
+                        width="100%", justify="center", align="center",
+                    ),
+                ),
                 rx.box(
-                    rx.plotly(data=State.plot_fig, config={"displayModeBar": False, "responsive": True}, width="100%"),
+                    rx.plotly(data=State.plot_fig.to(Any), config={"displayModeBar": False, "responsive": True}, width="100%"),
                     width="100%", border="1px solid var(--gray-4)",
                     border_radius="12px", overflow="hidden", padding_y="10px",
                 ),
+                rx.cond(
+                    State.pacing_txt != "",
+                    rx.text(State.pacing_txt, font_size="0.72em", color=rx.color("gray", 11), width="100%", text_align="center"),
+                ),
                 spacing="4", width=["98%", "500px"], padding="0.8em", margin_bottom="5em",
             ),
         ),
@@ -943,5 +3336,13 @@ app = rx.App(
         rx.el.meta(name="apple-mobile-web-app-title", content="Tristan Swim"),
         rx.el.meta(name="mobile-web-app-capable", content="yes"),
     ],
+    api_transformer=Starlette(routes=[Route("/metrics", metrics_endpoint), *EXPORT_ROUTES]),
 )
 app.add_page(index, route="/", on_load=State.on_load)
+app.add_page(qualif_page, route="/qualif", on_load=State.on_load)
+if WARMUP_ENABLED:
+    app.register_lifespan_task(warmup_task)
+if SCHEDULER_ENABLED:
+    app.register_lifespan_task(refresh_scheduler)
+if BACKFILL_ENABLED:
+    app.register_lifespan_task(backfill_task)
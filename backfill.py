@@ -0,0 +1,29 @@
+"""Reprise de l'historique FFN : classements et top 10 des saisons passées.
+
+    python backfill.py                       # toutes les saisons depuis la première perf
+    python backfill.py 2022 2023 --rps 1     # saisons choisies, débit réduit
+
+Interrompu, il reprend là où il s'était arrêté ; une saison terminée n'est plus
+jamais refetchée. Même travail que la tâche de fond FFN_BACKFILL=1 de l'app.
+"""
+import argparse, asyncio
+
+import app
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("seasons", nargs="*", type=int)
+    ap.add_argument("--workers", type=int, default=app.BACKFILL_WORKERS)
+    ap.add_argument("--rps", type=float, default=app.BACKFILL_RPS)
+    args = ap.parse_args()
+
+    async def run():
+        try:
+            return await app.backfill(args.seasons or None, args.workers, args.rps,
+                                      on_batch=lambda sai, st: print(f"{sai}  {st}"))
+        finally:
+            await app.get_fetcher().aclose()
+    print(asyncio.run(run()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""Benchmarks des parseurs FFN, du pipeline de rafraîchissement et du démarrage à froid.
+
+    python bench.py                          # parseurs + pipeline
+    python bench.py --only parsers           # ou pipeline
+    python bench.py --save bench_baseline.json
+    python bench.py --compare bench_baseline.json   # code retour 1 si régression
+    python bench.py --record                 # enregistre de vraies pages FFN dans fixtures/
+    python bench.py --only startup           # import à froid, compilation, première requête
+
+Le démarrage mesure, dans des process neufs, l'import de l'app, la compilation de
+l'état initial et des pages (sans numpy ni plotly) et la première
+requête, avec et sans warm_up. Les pages viennent du corpus fixtures/ (--record, ou FFN_RECORD_DIR=fixtures
+pendant l'utilisation de l'app) ; à défaut, des pages synthétiques de même
+structure sont générées. Le pipeline (équivalent de force_refresh) tourne contre
+ffn_stub.FFNStub avec latence configurable, sur une base et un cache temporaires.
+"""
+import argparse, asyncio, gc, json, os, platform, subprocess, sys, tempfile, time, tracemalloc
+from pathlib import Path
+
+# Base et cache jetables : le bench ne touche jamais aux données de l'app
+_TMP = tempfile.mkdtemp(prefix="natation-bench-")
+os.environ["NATATION_DB"] = os.path.join(_TMP, "natation.db")
+os.environ["FFN_CACHE_PATH"] = os.path.join(_TMP, "ffn_cache.db")
+
+import app
+from ffn_stub import FFNStub, synth_perf_page, synth_rank_page
+
+FIXTURES = Path(__file__).with_name("fixtures")
+
+def load_pages(page: str, synth) -> list:
+    """Pages enregistrées dans le corpus fixtures/, sinon pages synthétiques."""
+    corpus = app.Corpus(str(FIXTURES)) if FIXTURES.is_dir() else None
+    pages = [corpus.get(k) for k in corpus.keys(page)] if corpus else []
+    return pages or synth()
+
+# ── Parseurs ─────────────────────────────────────────────────────────────────
+
+def bench(name: str, fn, payloads: list, rows: int, min_time: float) -> dict:
+    """Débit (meilleure de 5 séries d'itérations, min_time au total) puis mémoire
+    (une itération sous tracemalloc : pic, et blocs/octets retenus par le résultat)."""
+    size = sum(len(p.encode()) for p in payloads)
+    fn(payloads)
+    n, per = 0, float("inf")
+    for _ in range(5):
+        k, t0 = 0, time.perf_counter()
+        while True:
+            fn(payloads); k += 1
+            dt = time.perf_counter() - t0
+            if dt >= min_time / 5: break
+        n, per = n + k, min(per, dt / k)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    keep = fn(payloads)
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    diff = [d for d in after.compare_to(before, "filename") if d.size_diff > 0]
+    del keep
+    return {
+        "name": name, "iterations": n, "seconds": round(per, 6), "rows": rows,
+        "rows_per_s": round(rows / per), "mb_per_s": round(size / per / 1e6, 2),
+        "alloc_blocks": sum(d.count_diff for d in diff), "alloc_kb": round(sum(d.size_diff for d in diff) / 1024, 1),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+def bench_parsers(min_time: float, n_rows: int) -> list:
+    ids = [s.id for s in app.ROSTER]
+    perf_pages = load_pages("nat_recherche.php", lambda: [synth_perf_page(n_rows, seed) for seed in range(3)])
+    rank_pages = load_pages("nat_rankings.php", lambda: [synth_rank_page(n_rows * 4, ids, seed) for seed in range(3)])
+    fragments = [r.raw for p in perf_pages for r in app.iter_rows(p)]
+    tippys = [t for p in perf_pages for t in app._TIPPY_RE.findall(p)]
+    perf_rows = sum(1 for p in perf_pages for _ in app.iter_performances(p))
+    # Lignes réellement extraites par chaque parseur (pas les <tr> de la page) :
+    # parse_ranking_row ne lit que la ligne du nageur, parse_ranking_table toutes
+    found = lambda p, sid: app.parse_ranking_row(p, sid)["national"] != "-"
+    row_rows = sum(found(p, ids[0]) for p in rank_pages)
+    roster_rows = sum(found(p, sid) for p in rank_pages for sid in ids)
+    top10_rows = sum(len(app.parse_top10(p, ids)) for p in rank_pages)
+    table_rows = sum(len(app.parse_ranking_table(p, ids).ids) for p in rank_pages)
+    return [
+        bench("iter_performances", lambda ps: [list(app.iter_performances(p)) for p in ps], perf_pages, perf_rows, min_time),
+        bench("parse_row", lambda fs: [app.parse_row(f) for f in fs], fragments, len(fragments), min_time),
+        bench("parse_splits", lambda ts: [app.parse_splits(t) for t in ts], tippys,
+              sum(len(app.parse_splits(t)) for t in tippys), min_time),
+        bench("parse_ranking_row", lambda ps: [app.parse_ranking_row(p, ids[0]) for p in ps], rank_pages, row_rows, min_time),
+        bench("parse_rankings", lambda ps: [app.parse_rankings(p, ids) for p in ps], rank_pages, roster_rows, min_time),
+        bench("parse_top10", lambda ps: [app.parse_top10(p, ids) for p in ps], rank_pages, top10_rows, min_time),
+        bench("parse_ranking_table", lambda ps: [app.parse_ranking_table(p, ids) for p in ps], rank_pages, table_rows, min_time),
+    ]
+
+# ── Pipeline contre un serveur local ─────────────────────────────────────────
+
+def bench_pipeline(latency: float, n_rows: int) -> list:
+    stub = FFNStub(rows=n_rows, latency=latency).start()
+    app.FFN_BASE = stub.base
+    app.STORE = app.Store(os.path.join(_TMP, "pipeline.db"))
+    app.CACHE = app.ResponseCache(os.path.join(_TMP, "pipeline_cache.db"))
+
+    async def run():
+        await app.refresh_dataset()
+        hits = stub.stats["requests"]
+        await app.get_fetcher().aclose()
+        return hits
+
+    out = []
+    for label in ("cold", "warm"):       # warm : cache HTTP frais, classements à jour
+        hits0, bytes0 = stub.stats["requests"], stub.stats["bytes"]
+        t0 = time.perf_counter()
+        hits = asyncio.run(run())
+        dt = time.perf_counter() - t0
+        out.append({"name": f"refresh_{label}", "seconds": round(dt, 4), "requests": hits - hits0,
+                    "kb": round((stub.stats["bytes"] - bytes0) / 1024, 1), "latency_ms": round(latency * 1000)})
+    stub.close()
+    return out
+
+# ── Démarrage à froid ────────────────────────────────────────────────────────
+
+# Exécuté dans un process neuf : import de l'app, puis ce que calcule la première
+# vue d'une nage (modèle, graphique, allure, qualifs), avec ou sans warm_up préalable
+_STARTUP_PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+from reflex.compiler.utils import _compile_initial_state
+from reflex.state import State
+_compile_initial_state(State)   # ce que `reflex run` évalue avant de servir
+app.index(); app.qualif_page()
+tc = time.perf_counter()
+heavy = int("numpy" in sys.modules) + int("plotly.graph_objects" in sys.modules)
+if sys.argv[1] == "warm": app.warm_up()
+t2 = time.perf_counter()
+sid, version = app.ROSTER[0].id, app.STORE.version("results")
+nage = (app.results_model(sid, version).events("50m") or [""])[0]
+app.progression_json(sid, version, nage, "50m", "U15", 0, "")
+app.pacing_model(sid, version).event(nage, "50m")
+app.qualif_overview(version, app.current_season_year())
+print(json.dumps({"import": t1 - t0, "compile": tc - t1, "heavy": heavy, "warmup": t2 - tc,
+                  "first_request": time.perf_counter() - t2}))
+"""
+
+def bench_startup(n_rows: int, runs: int = 5) -> list:
+    """Médiane sur `runs` process neufs, contre une base remplie par le stub."""
+    db = os.path.join(_TMP, "startup.db")
+    stub = FFNStub(rows=n_rows).start()
+    app.FFN_BASE, app.STORE = stub.base, app.Store(db)
+    async def fill():
+        await app.refresh_dataset()
+        await app.get_fetcher().aclose()
+    asyncio.run(fill())
+    stub.close()
+    env = dict(os.environ, NATATION_DB=db, FFN_SCHEDULER="0", PYTHONPATH=str(Path(__file__).parent))
+    def probe(mode: str) -> dict:
+        out = [json.loads(subprocess.run([sys.executable, "-c", _STARTUP_PROBE, mode], env=env, check=True,
+                                         capture_output=True, text=True).stdout.splitlines()[-1]) for _ in range(runs)]
+        return {k: round(sorted(o[k] for o in out)[runs // 2], 4) for k in out[0]}
+    lazy, warm = probe("lazy"), probe("warm")
+    return [
+        {"name": "startup_import", "seconds": lazy["import"]},
+        # heavy : numpy / plotly.graph_objects chargés par la compilation (attendu : 0)
+        {"name": "startup_compile", "seconds": lazy["compile"], "heavy_modules": lazy["heavy"]},
+        {"name": "startup_first_request", "seconds": lazy["first_request"]},
+        {"name": "startup_first_request_warm", "seconds": warm["first_request"], "warmup_s": warm["warmup"]},
+    ]
+
+# ── Enregistrement de fixtures ───────────────────────────────────────────────
+
+def record():
+    """Pages réelles du roster (perfs 25/50 m + classements de la saison) → corpus fixtures/."""
+    app.RECORDER = app.Corpus(str(FIXTURES))
+    sai = app.current_season_year()
+    urls = [app.perf_url(s.id, bc) for s in app.ROSTER for bc in ("25", "50")]
+    urls += list(dict.fromkeys(app.ranking_table_url(t[0], t[3], t[4]) for t in app.roster_ranking_tasks(sai)))[:6]
+    async def run():
+        await asyncio.gather(*map(app.fetch_url_async, urls))
+        await app.get_fetcher().aclose()
+    asyncio.run(run())
+    for k in app.RECORDER.keys():
+        print(k)
+
+# ── Rapport / baseline ───────────────────────────────────────────────────────
+
+# Métrique comparée par résultat et sens (1 = plus grand est mieux)
+_KEY_METRIC = {"rows_per_s": 1, "seconds": -1}
+
+def compare(results: list, baseline: dict, tolerance: float) -> int:
+    base = {r["name"]: r for r in baseline["results"]}
+    regressions = 0
+    for r in results:
+        b = base.get(r["name"])
+        if not b:
+            print(f"{r['name']:<20} (absent de la baseline)")
+            continue
+        # Même charge mais lignes comptées autrement : seul le temps par itération se compare
+        metric = "rows_per_s" if "rows_per_s" in r and r.get("rows") == b.get("rows") else "seconds"
+        ratio = r[metric] / b[metric] if b[metric] else 1.0
+        worse = ratio < 1 - tolerance if _KEY_METRIC[metric] > 0 else ratio > 1 + tolerance
+        regressions += worse
+        print(f"{r['name']:<20} {metric:<10} {b[metric]:>12} → {r[metric]:>12}  ×{ratio:.2f}{'  RÉGRESSION' if worse else ''}")
+    return regressions
+
+def revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent).stdout.strip()
+    except OSError:
+        return ""
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--only", choices=("parsers", "pipeline", "startup"))
+    ap.add_argument("--min-time", type=float, default=0.5, help="durée minimale par parseur (s)")
+    ap.add_argument("--rows", type=int, default=200, help="lignes par page synthétique")
+    ap.add_argument("--latency", type=float, default=0.05, help="latence du serveur local (s)")
+    ap.add_argument("--save", metavar="JSON")
+    ap.add_argument("--compare", metavar="JSON")
+    ap.add_argument("--tolerance", type=float, default=0.15, help="écart toléré avant régression")
+    ap.add_argument("--record", action="store_true")
+    args = ap.parse_args()
+    if args.record:
+        return record()
+
+    results = []
+    if args.only in (None, "parsers"):  results += bench_parsers(args.min_time, args.rows)
+    if args.only in (None, "pipeline"): results += bench_pipeline(args.latency, args.rows)
+    if args.only in (None, "startup"):  results += bench_startup(args.rows)
+    for r in results:
+        print("  ".join(f"{k}={v}" for k, v in r.items()))
+
+    if args.save:
+        Path(args.save).write_text(json.dumps({
+            "revision": revision(), "python": platform.python_version(), "machine": platform.machine(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results,
+        }, indent=2, ensure_ascii=False) + "\n")
+    if args.compare:
+        sys.exit(1 if compare(results, json.loads(Path(args.compare).read_text()), args.tolerance) else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""Serveur FFN local : rejoue un corpus de pages enregistrées, synthétise le reste.
+
+    FFN_RECORD_DIR=fixtures reflex run               # enregistre les vraies réponses
+    python ffn_stub.py --corpus fixtures --port 8765 --latency 0.2 --jitter 0.1
+    python ffn_stub.py --error-rate 0.05 --errors 503,429,reset --kbps 200
+    FFN_BASE_URL=http://127.0.0.1:8765 reflex run    # l'app vise le stub
+
+Les réponses sont indexées par app.corpus_key (page + paramètres triés), les
+mêmes que construisent perf_url et ranking_url. Sans page enregistrée, le stub
+génère une page de même structure (déterministe pour une URL donnée).
+"""
+import argparse, gzip, hashlib, html, random, threading, time, zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import app
+
+PAGES = ("nat_recherche.php", "nat_rankings.php")
+ERROR_KINDS = ("500", "503", "429", "reset", "stall")
+
+# ── Pages synthétiques (structure des pages FFN) ─────────────────────────────
+
+def _t(cs: int) -> str:
+    return app.format_cs(cs)
+
+def synth_splits(rnd: random.Random, dist: int) -> str:
+    """Tableau de temps de passage tous les 50 m, deux colonnes comme sur le site."""
+    laps = [rnd.randint(2800, 4200) for _ in range(dist // 50)]
+    cells, cumul = [], 0
+    for i, lap in enumerate(laps):
+        cumul += lap
+        half = f"[{_t(lap + laps[i - 1])}]" if i % 2 else ""
+        cells.append((f"{(i + 1) * 50}m :", _t(cumul), f"({_t(lap)})", half))
+    rows = []
+    for i in range(0, len(cells), 2):
+        # Colonne de gauche fermée par une bordure : c'est le séparateur que cherche parse_splits
+        d, c, l, h = cells[i]
+        row = f'<td>{d}</td><td>{c}</td><td>{l}</td><td style="border-right: 1px solid #ccc">{h}</td>'
+        if i + 1 < len(cells):
+            row += "".join(f"<td>{v}</td>" for v in cells[i + 1])
+        rows.append(f"<tr>{row}</tr>")
+    return html.escape("<table>" + "".join(rows) + "</table>", quote=True)
+
+def synth_perf_page(n: int, seed: int = 0) -> str:
+    rnd = random.Random(seed)
+    events = list(app.EPREUVE_CODES)
+    out = ["<html><body><table>"]
+    for i in range(n):
+        epr = rnd.choice(events)
+        dist = int(epr.split()[0])
+        cs = dist * rnd.randint(60, 90)
+        tip = f' data-tippy-content="{synth_splits(rnd, dist)}"' if dist >= 100 else ""
+        out.append(
+            f'<tr class="border-b"><th class="text-left">{epr}</th>'
+            f'<td><span{tip}>{_t(cs)}</span></td><td>(U{rnd.randint(11, 17)})</td><td>{rnd.randint(300, 1200)} pts</td>'
+            f'<td>CLUB {i % 7}<p class="text-xs">Meeting {i}</p> <p>FRA</p></td>'
+            f'<td>{rnd.randint(1, 28):02d}/{rnd.randint(1, 12):02d}/{rnd.randint(2019, 2025)}</td><td>[NAT]</td>'
+            f'<td><a href="/webffn/resultats.php?idact=nat&go=res&idcpt={i}">R</a></td><td></td></tr>')
+    out.append("</table></body></html>")
+    return "\n".join(out)
+
+# Géographie synthétique : 90 clubs répartis sur 12 départements et 3 régions ;
+# le premier département et sa région sont ceux de l'app, le roster est au club 0
+_DEPTS = [app.DEPT_ID] + [2000 + k for k in range(1, 12)]
+_REGION_OF = {d: app.REGION_ID if k < 4 else 3000 + k // 4 for k, d in enumerate(_DEPTS)}
+
+def synth_rank_page(n: int, ids=(), seed: int = 0, dist: int = 50, splits: bool = False, sai: Optional[int] = None,
+                    cat: Optional[int] = None, dept: Optional[int] = None, region: Optional[int] = None,
+                    geo: bool = True) -> str:
+    """Classement national toutes catégories de n nageurs (années de naissance,
+    clubs, départements et régions variés), les ids du roster répartis dans la
+    page ; cat/dept/region en donnent la vue filtrée, comme idcat/iddep/idreg.
+    Les 6 rangs du tippy sont cohérents avec ces attributs. splits=True ajoute
+    les temps de passage au temps de chaque ligne (pages lourdes) ; geo=False
+    retire iddep/idreg du lien club (lignes sans département ni région)."""
+    rnd = random.Random(seed)
+    sai = sai or app.current_season_year()
+    ids = list(ids)
+    at = {n * (k + 1) // (len(ids) + 1): sid for k, sid in enumerate(ids)}
+    seen: dict[tuple, int] = {}
+    def rank(*key) -> int:
+        seen[key] = seen.get(key, 0) + 1
+        return seen[key]
+    out, pos = ["<table><thead><tr><th>#</th></tr></thead><tbody>"], 0
+    for i in range(n):   # temps strictement croissants : rang = ordre d'arrivée dans le groupe
+        sid = at.get(i, str(1_000_000 + i))
+        member = app.ROSTER_BY_ID.get(sid)
+        birth = member.birth_year if member else sai - 10 - (7 * i + seed) % 8
+        club = 0 if member else 37 * i % 90
+        d = _DEPTS[club % len(_DEPTS)]
+        r = _REGION_OF[d]
+        tip = html.escape(
+            f"Rang national par cat. → <b>{rank('n', birth)}</b><br>Rang régional par cat. → <b>{rank('r', r, birth)}</b><br>"
+            f"Rang départ. par cat. → <b>{rank('d', d, birth)}</b><br>Rang national toutes cat. → <b>{rank('n')}</b><br>"
+            f"Rang régional toutes cat. → <b>{rank('r', r)}</b><br>Rang départ. toutes cat. → <b>{rank('d', d)}</b>", quote=True)
+        t = _t(dist * 50 + (7 * i + rnd.randint(0, 6)) * dist // 50)
+        if splits and dist >= 100: t = f'<span data-tippy-content="{synth_splits(rnd, dist)}">{t}</span>'
+        if (cat is not None and birth != sai - cat) or dept not in (None, d) or region not in (None, r): continue
+        pos += 1
+        out.append(
+            f'<tr class="border-b"><td>{pos}.</td>'
+            f'<th><a href="nat_recherche.php?idact=nat&idrch_id={sid}">NOM{i} Prénom ({birth} / {sai - birth} ans) FRA</a></th>'
+            f'<td>{birth}</td><td>{t}</td>'
+            f'<td><span data-tippy-content="{tip}">i</span></td>'
+            f'<td><a href="nat_clubs.php?idact=nat&idclb={club}{f"&iddep={d}&idreg={r}" if geo else ""}">CLUB {club}</a></td></tr>')
+    out.append("</tbody></table>")
+    return "\n".join(out)
+
+_DIST_BY_CODE = {code: int(name.split()[0]) for name, code in app.EPREUVE_CODES.items()}
+
+def synth_page(key: str, rows: int = 200, splits: bool = False, geo: bool = False) -> Optional[str]:
+    """Page synthétique pour une clé de corpus. Les classements d'une même
+    (épreuve, bassin, saison) sont des vues d'une seule population nationale."""
+    page, _, query = key.partition("?")
+    q = dict(parse_qsl(query))
+    if page == "nat_recherche.php":
+        return synth_perf_page(rows, zlib.crc32(key.encode()))
+    if page == "nat_rankings.php":
+        seed = zlib.crc32(urlencode(sorted((k, v) for k, v in q.items() if k not in ("idcat", "iddep", "idreg"))).encode())
+        dist = _DIST_BY_CODE.get(int(q.get("idepr", 0) or 0), 50)
+        opt = lambda k: int(q[k]) if q.get(k) else None
+        return synth_rank_page(rows * 4, [s.id for s in app.ROSTER], seed, dist, splits,
+                               opt("idsai"), opt("idcat"), opt("iddep"), opt("idreg"), geo)
+    return None
+
+# ── Serveur ──────────────────────────────────────────────────────────────────
+
+class FFNStub:
+    """Stand-in HTTP/1.1 de ffn.extranat.fr (thread de fond).
+
+    latency/jitter : délai avant réponse (s) ; error_rate : part des requêtes qui
+    échouent avec une des `errors` (500, 503, 429 + Retry-After, reset = socket
+    coupé, stall = pas de réponse avant stall_s) ; bytes_per_s : débit par réponse ;
+    geo=True : lignes de classement avec département et région (iddep/idreg dans
+    le lien club). Aucune page FFN enregistrée ne les porte à ce jour : par défaut,
+    l'app passe donc par ses replis (pages départ./région., tippy des rangs).
+    Réponses gzip si demandées, ETag + 304 pour la revalidation du cache."""
+
+    def __init__(self, corpus: Optional[str] = None, synth: bool = True, rows: int = 200, splits: bool = False,
+                 latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, errors=("503",),
+                 bytes_per_s: int = 0, stall_s: float = 30.0, host: str = "127.0.0.1", port: int = 0, geo: bool = False):
+        self.corpus = app.Corpus(corpus) if corpus else None
+        self.synth, self.rows, self.splits, self.geo = synth, rows, splits, geo
+        self.latency, self.jitter = latency, jitter
+        self.error_rate, self.errors, self.stall_s = error_rate, tuple(errors), stall_s
+        self.bytes_per_s = bytes_per_s
+        self.stats = {"requests": 0, "bytes": 0, "replayed": 0, "synthesized": 0, "not_found": 0,
+                      "not_modified": 0, "errors_injected": 0}
+        self._pages: dict[str, bytes] = {}
+        self._lock = threading.Lock()
+        self._rnd = random.Random(0)
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            def log_message(self, *a): pass
+            def do_GET(self): stub.handle(self)
+
+        class Server(ThreadingHTTPServer):
+            request_queue_size = 128
+            daemon_threads = True
+
+        self.server = Server((host, port), Handler)
+        self.base = f"http://{host}:{self.server.server_port}"
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "FFNStub":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _count(self, **inc):
+        with self._lock:
+            for k, v in inc.items(): self.stats[k] += v
+
+    def page(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            body = self._pages.get(key)
+        if body is not None: return body
+        text = self.corpus.get(key) if self.corpus else None
+        if text is not None:
+            self._count(replayed=1)
+        elif self.synth and (text := synth_page(key, self.rows, self.splits, self.geo)) is not None:
+            self._count(synthesized=1)
+        else:
+            return None
+        body = text.encode("utf-8")
+        with self._lock: self._pages[key] = body
+        return body
+
+    def handle(self, req: BaseHTTPRequestHandler):
+        self._count(requests=1)
+        delay = self.latency + (self._rnd.uniform(0, self.jitter) if self.jitter else 0)
+        if delay: time.sleep(delay)
+        if self.error_rate and self._rnd.random() < self.error_rate:
+            self._count(errors_injected=1)
+            return self._fail(req, self._rnd.choice(self.errors))
+
+        path = urlsplit(req.path).path.rsplit("/", 1)[-1]
+        body = self.page(app.corpus_key(req.path)) if path in PAGES else None
+        if body is None:
+            self._count(not_found=1)
+            return self._send(req, 404, b"not found")
+        etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+        if req.headers.get("If-None-Match") == etag:
+            self._count(not_modified=1)
+            return self._send(req, 304, b"", {"ETag": etag})
+        headers = {"Content-Type": "text/html; charset=utf-8", "ETag": etag}
+        if "gzip" in req.headers.get("Accept-Encoding", ""):
+            body, headers["Content-Encoding"] = gzip.compress(body, 5), "gzip"
+        self._send(req, 200, body, headers)
+
+    def _fail(self, req: BaseHTTPRequestHandler, kind: str):
+        if kind == "reset":
+            req.close_connection = True
+            return
+        if kind == "stall":
+            time.sleep(self.stall_s)
+            req.close_connection = True
+            return
+        self._send(req, int(kind), b"erreur injectee", {"Retry-After": "1"} if kind == "429" else {})
+
+    def _send(self, req: BaseHTTPRequestHandler, status: int, body: bytes, headers: Optional[dict] = None):
+        req.send_response(status)
+        for k, v in (headers or {}).items(): req.send_header(k, v)
+        req.send_header("Content-Length", str(len(body)))
+        req.end_headers()
+        if not self.bytes_per_s:
+            req.wfile.write(body)
+        else:
+            # Débit limité : morceaux de 16 ko espacés
+            for i in range(0, len(body), 16384):
+                chunk = body[i:i + 16384]
+                req.wfile.write(chunk)
+                req.wfile.flush()
+                time.sleep(len(chunk) / self.bytes_per_s)
+        self._count(bytes=len(body))
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--corpus", help="répertoire enregistré (FFN_RECORD_DIR)")
+    ap.add_argument("--no-synth", action="store_true", help="404 pour les pages absentes du corpus")
+    ap.add_argument("--rows", type=int, default=200, help="lignes des pages synthétiques")
+    ap.add_argument("--splits", action="store_true", help="temps de passage dans les classements synthétiques")
+    ap.add_argument("--geo", action="store_true", help="classements avec iddep/idreg dans les lignes")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.0)
+    ap.add_argument("--jitter", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--errors", default="503", help=f"parmi {','.join(ERROR_KINDS)}")
+    ap.add_argument("--kbps", type=float, default=0, help="débit max par réponse (ko/s)")
+    args = ap.parse_args()
+    errors = [e for e in args.errors.split(",") if e in ERROR_KINDS] or ["503"]
+    stub = FFNStub(args.corpus, not args.no_synth, args.rows, args.splits, args.latency, args.jitter,
+                   args.error_rate, errors, int(args.kbps * 1024), host=args.host, port=args.port, geo=args.geo)
+    print(f"FFN local sur {stub.base}  (FFN_BASE_URL={stub.base})")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(stub.stats)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Snapshot statique du jeu de données, pour servir les visiteurs en lecture seule.
+
+    python snapshot.py                       # ./snapshot (ou NATATION_SNAPSHOT_DIR)
+    python snapshot.py /var/www/natation --refresh
+
+Un bundle JSON par nageur × épreuve × bassin (résultats, record, écart à la
+qualif, classements, top 10, graphique) et un pour /qualif, nommés d'après leur
+contenu et doublés d'une copie .gz ; manifest.json les référence et index.html
+les affiche dans un navigateur. Les fichiers inchangés ne sont pas réécrits. --refresh rafraîchit d'abord depuis la FFN et
+attend les top 10 de la saison.
+"""
+import argparse, asyncio
+
+import app
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("out_dir", nargs="?", default="")
+    ap.add_argument("--refresh", action="store_true")
+    args = ap.parse_args()
+
+    if args.refresh:
+        async def run():
+            try:
+                await app.refresh_dataset()
+                sai, pf = app.current_season_year(), app.get_prefetcher()
+                jobs = {(sai, r["E"].rstrip("."), r["B"], sai - s.birth_year)
+                        for s in app.ROSTER for r in app.STORE.results(s.id)}
+                await asyncio.gather(*map(pf.ensure, jobs))
+            finally:
+                await app.get_fetcher().aclose()
+        asyncio.run(run())
+    print(app.build_snapshot(args.out_dir))
+
+if __name__ == "__main__":
+    main()
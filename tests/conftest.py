@@ -0,0 +1,33 @@
+"""Base, cache HTTP et contrôleur de fetch propres à chaque test : l'app est
+importée avec des chemins temporaires, jamais ceux de l'utilisateur."""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_TMP = tempfile.mkdtemp(prefix="natation-tests-")
+os.environ["NATATION_DB"] = os.path.join(_TMP, "natation.db")
+os.environ["FFN_CACHE_PATH"] = os.path.join(_TMP, "ffn_cache.db")
+
+import pytest
+
+import app
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    st = app.Store(str(tmp_path / "natation.db"))
+    monkeypatch.setattr(app, "STORE", st)
+    return st
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    c = app.ResponseCache(str(tmp_path / "ffn_cache.db"))
+    monkeypatch.setattr(app, "CACHE", c)
+    return c
+
+@pytest.fixture
+def control(monkeypatch):
+    """Contrôleur neuf (les fetchers par boucle le prennent à leur création), sans plafond de débit gênant."""
+    c = app.ConcurrencyController(rps=1000)
+    monkeypatch.setattr(app, "FETCH_CONTROL", c)
+    return c
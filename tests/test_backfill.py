@@ -0,0 +1,50 @@
+"""Reprise de l'historique contre le stub FFN : seules les pages sans point de
+reprise sont refetchées, et une saison terminée ne l'est plus jamais."""
+import asyncio
+
+import pytest
+
+import app
+import ffn_stub
+
+@pytest.fixture
+def stub(monkeypatch):
+    # Lignes avec département/région : une requête par page, sans pages de repli
+    s = ffn_stub.FFNStub(rows=50, geo=True).start()
+    monkeypatch.setattr(app, "FFN_BASE", s.base)
+    yield s
+    s.close()
+
+def run_backfill(sai: int, **kw) -> dict:
+    async def run():
+        try: return await app.backfill([sai], rps=1000, **kw)
+        finally: await app.get_fetcher().aclose()
+    return asyncio.run(run())
+
+def test_resume_skips_checkpointed_pages(store, control, stub):
+    sai = app.current_season_year() - 1
+    jobs = app.backfill_jobs(sai)
+    store.put_backfill(sai, [(key, "done", job[1], job[2], {}) for key, job in jobs[:10]])
+    stats = run_backfill(sai)
+    assert stats == {"seasons": 1, "pages": len(jobs) - 10, "errors": 0, "skipped": 10}
+    assert stub.stats["requests"] == len(jobs) - 10
+    assert sai in store.completed_seasons()
+    assert store.top10(sai, jobs[-1][1][1], jobs[-1][1][2], "dept", sai - app.ROSTER[0].birth_year)
+
+    requests = stub.stats["requests"]
+    assert run_backfill(sai)["pages"] == 0   # saison figée
+    assert stub.stats["requests"] == requests
+
+def test_interrupted_run_resumes_after_last_batch(store, control, stub):
+    sai = app.current_season_year() - 1
+    jobs = app.backfill_jobs(sai)
+    def stop(*_): raise RuntimeError("interrompu")
+    with pytest.raises(RuntimeError):
+        run_backfill(sai, workers=1, on_batch=stop)
+    state = store.backfill_state(sai)
+    assert len(state) == app.BACKFILL_BATCH and sai not in store.completed_seasons()
+
+    before = stub.stats["requests"]
+    stats = run_backfill(sai, workers=1)
+    assert stats["skipped"] == app.BACKFILL_BATCH and stats["seasons"] == 1
+    assert stub.stats["requests"] - before == len(jobs) - app.BACKFILL_BATCH
@@ -0,0 +1,139 @@
+"""AsyncFetcher contre un serveur HTTP/1.1 brut : redirections, corps chunked,
+réutilisation des connexions, annulation."""
+import asyncio
+
+import pytest
+
+import app
+
+OK       = b"HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\nhello"
+CHUNKED  = b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n3;ext=1\r\nhel\r\n2\r\nlo\r\n0\r\nX-Trailer: 1\r\n\r\n"
+MOVED    = b"HTTP/1.1 302 Found\r\nLocation: /ok\r\nContent-Length: 0\r\n\r\n"
+LOOP     = b"HTTP/1.1 301 Moved Permanently\r\nLocation: /loop\r\nContent-Length: 0\r\n\r\n"
+NOWHERE  = b"HTTP/1.1 302 Found\r\nContent-Length: 0\r\n\r\n"
+
+async def slow(writer):
+    await asyncio.sleep(30)
+
+class Server:
+    """Réponses brutes par chemin (octets, ou coroutine qui écrit elle-même) ; un
+    chemin en « -close » coupe la connexion après la réponse, sans prévenir."""
+
+    def __init__(self, routes: dict):
+        self.routes = {"/ok": OK, "/ok-close": OK, **routes}
+        self.connections, self.paths = 0, []
+
+    async def __aenter__(self):
+        self.srv = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        self.base = f"http://127.0.0.1:{self.srv.sockets[0].getsockname()[1]}"
+        return self
+
+    async def __aexit__(self, *exc):
+        self.srv.close()
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while line := await reader.readline():
+                path = line.split()[1].decode()
+                while (await reader.readline()) not in (b"\r\n", b""): pass
+                self.paths.append(path)
+                route = self.routes[path]
+                if callable(route): await route(writer)
+                else: writer.write(route)
+                await writer.drain()
+                if path.endswith("-close"): break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+def fetcher(control=None) -> app.AsyncFetcher:
+    return app.AsyncFetcher(retries=0, control=control or app.ConcurrencyController(rps=1000))
+
+def test_redirect_is_followed():
+    async def run():
+        async with Server({"/old": MOVED}) as srv:
+            f = fetcher()
+            status, _, body = await f.get(srv.base + "/old")
+            await f.aclose()
+        return status, body, srv.paths
+    assert asyncio.run(run()) == (200, "hello", ["/old", "/ok"])
+
+def test_redirect_loop_and_missing_location():
+    async def run():
+        async with Server({"/loop": LOOP, "/nowhere": NOWHERE}) as srv:
+            f = fetcher()
+            with pytest.raises(app.FetchError):
+                await f.get(srv.base + "/loop")
+            looped = len(srv.paths)
+            status, _, body = await f.get(srv.base + "/nowhere")
+            await f.aclose()
+        return looped, status, body
+    assert asyncio.run(run()) == (app.FETCH_MAX_REDIRECTS + 1, 302, "")
+
+def test_unresolved_redirect_is_not_cached(cache, control):
+    async def run():
+        async with Server({"/nowhere": NOWHERE}) as srv:
+            url = srv.base + "/nowhere"
+            with pytest.raises(app.FetchError):
+                await app.fetch_url_async(url)
+            await app.get_fetcher().aclose()
+        return app.normalize_url(url)
+    assert cache.get(asyncio.run(run())) is None
+
+def test_chunked_body_on_a_reused_connection():
+    async def run():
+        async with Server({"/chunked": CHUNKED}) as srv:
+            f = fetcher()
+            first = await f.get(srv.base + "/chunked")
+            second = await f.get(srv.base + "/ok")
+            await f.aclose()
+        return first[2], second[2], srv.connections
+    # Trailer lu jusqu'au bout : la requête suivante repart sur la même socket
+    assert asyncio.run(run()) == ("hello", "hello", 1)
+
+def test_pooled_connection_closed_by_server_is_replaced():
+    async def run():
+        async with Server({}) as srv:
+            f = fetcher()
+            await f.get(srv.base + "/ok-close")
+            await asyncio.sleep(0.05)
+            _, _, body = await f.get(srv.base + "/ok")
+            await f.aclose()
+        return body, srv.connections
+    assert asyncio.run(run()) == ("hello", 2)
+
+def test_cancelled_request_frees_its_slot_and_socket():
+    control = app.ConcurrencyController(max_limit=1, initial=1, rps=1000)
+    async def run():
+        async with Server({"/slow": slow}) as srv:
+            f = fetcher(control)
+            task = asyncio.create_task(f.get(srv.base + "/slow"))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            after_cancel = control.inflight, sum(map(len, f._idle.values()))
+            _, _, body = await asyncio.wait_for(f.get(srv.base + "/ok"), 5)
+            await f.aclose()
+        return after_cancel, body, srv.connections
+    # La socket de la requête annulée n'est pas rendue au pool : la suivante en ouvre une autre
+    assert asyncio.run(run()) == ((0, 0), "hello", 2)
+
+def test_cancelled_while_waiting_for_rate_slot():
+    control = app.ConcurrencyController(max_limit=1, initial=1, rps=1)
+    async def run():
+        async with Server({}) as srv:
+            f = fetcher(control)
+            await f.get(srv.base + "/ok")   # consomme le créneau de débit
+            task = asyncio.create_task(f.get(srv.base + "/ok"))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            inflight = control.inflight
+            _, _, body = await asyncio.wait_for(f.get(srv.base + "/ok"), 5)
+            await f.aclose()
+        return inflight, body
+    assert asyncio.run(run()) == (0, "hello")
@@ -0,0 +1,36 @@
+"""Chemins rapides des pages de performances : mêmes résultats que le découpage Row/Cell."""
+import html
+import random
+
+import app
+import ffn_stub
+
+def test_rows_match_cell_tokenizer():
+    page = ffn_stub.synth_perf_page(60, seed=3)
+    fast = list(app.iter_performances(page))
+    slow = []
+    for row in app.iter_rows(page):
+        if "border-b" in row.attrs:
+            ths, tds = row.ths, row.tds
+            slow.append(app.normalize_perf(app.perf_from_cells(ths[0].inner, [td.inner for td in tds[:8]])))
+    assert fast == slow and len(fast) == 60
+    assert all(p.date_ord and p.temps_cs for p in fast)
+
+def test_splits_match_cell_tokenizer_on_variants():
+    tippy = ffn_stub.synth_splits(random.Random(1), 400)
+    table = html.unescape(tippy)
+    variants = [
+        tippy,
+        html.escape(table.replace("<td>", "<td> \n")),                             # blancs
+        html.escape(table.replace("</td><td>(", "</td><td><b>(")),                  # balises
+        html.escape(table.replace("m :", "m&nbsp;:")),                              # entités
+        html.escape(table.replace('<td style="border-right: 1px solid #ccc">', "<td>")),   # sans séparateur
+    ]
+    for v in variants:
+        assert app.parse_splits(v) == app._parse_splits_cells(v)
+    assert [s.distance_m for s in app.parse_splits(tippy)] == list(range(50, 401, 50))
+
+def test_date_ord():
+    assert app.parse_date_ord(" 1/2/2024 ") == app.date(2024, 2, 1).toordinal()
+    assert app.parse_date_ord("31/02/2024") is None
+    assert app.parse_date_ord("2024-02-01") is None
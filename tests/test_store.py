@@ -0,0 +1,65 @@
+"""Store : schéma créé d'emblée à sa version, versions par domaine groupées par lot."""
+import sqlite3
+import threading
+
+import app
+
+TABLES = {"performances", "perf_splits", "rankings", "top10", "ranking_pages",
+          "backfill_pages", "backfill_seasons", "meta"}
+
+def perf(epreuve="50 NL", temps="00:30.00", date="01/02/2025") -> app.Performance:
+    p = app.Performance(epreuve, temps, "U14", "500 pts", "CLUB", "FRA", date, "[NAT]", "Meeting", "",
+                        [app.Split(50, temps, temps, "")])
+    return app.normalize_perf(p)
+
+def test_fresh_database_gets_final_schema(tmp_path):
+    path = str(tmp_path / "n.db")
+    st = app.Store(path)
+    assert st.versions() == {"results": 0, "rankings": 0}
+    db = sqlite3.connect(path)
+    assert db.execute("PRAGMA user_version").fetchone()[0] == app.SCHEMA_VERSION == 1
+    assert TABLES <= {r[0] for r in db.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+
+def test_reopen_keeps_data(tmp_path):
+    path = str(tmp_path / "n.db")
+    app.Store(path).replace_results("1", [("50m", perf())])
+    st = app.Store(path)
+    assert [r["T"] for r in st.results("1")] == ["00:30.00"]
+    assert len(st.splits(st.results("1")[0]["id"])) == 1
+    assert st.versions() == {"results": 1, "rankings": 0}
+
+def test_unchanged_write_keeps_version(store):
+    store.replace_results("1", [("50m", perf())])
+    store.replace_results("1", [("50m", perf())])
+    assert store.version("results") == 1
+    store.replace_results("1", [("50m", perf(temps="00:29.50"))])
+    assert store.version("results") == 2
+
+def test_batch_bumps_each_domain_once(store):
+    before = store.version()
+    with store.batch():
+        store.replace_results("1", [("50m", perf())])
+        store.replace_results("2", [("25m", perf())])
+        with store.batch():
+            store.put_ranking_table(2025, "50 NL", "50m", 14, {"1": {"dept": "3"}}, {})
+        assert store.versions() == {"results": 0, "rankings": 0}   # différé jusqu'au lot le plus externe
+    assert store.versions() == {"results": 1, "rankings": 1}
+    assert store.version() == before + 1
+
+def test_batch_defers_only_its_own_thread(store):
+    with store.batch():
+        store.replace_results("1", [("50m", perf())])
+        t = threading.Thread(target=store.put_ranking_table, args=(2025, "50 NL", "50m", 14, {"1": {"dept": "3"}}, {}))
+        t.start()
+        t.join()
+        assert store.versions() == {"results": 0, "rankings": 1}
+    assert store.versions() == {"results": 1, "rankings": 1}
+
+def test_failed_batch_still_publishes_committed_writes(store):
+    try:
+        with store.batch():
+            store.replace_results("1", [("50m", perf())])
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert store.version("results") == 1